@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def discard_post_views():
+    """Просмотры из теста не должны дожить до записи в базу."""
+    yield
+    from posts import view_counter
+    view_counter.discard()
@@ -0,0 +1,35 @@
+"""SQLite с пулом соединений и настоящей проверкой исправности.
+
+Подключается как ``ENGINE = 'core.backends.sqlite3'``; пул включается
+ключом ``POOL`` описания базы, см. ``core.db``.
+"""
+from django.db.backends.sqlite3 import base
+
+from core import db
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    # Пул, из которого взято текущее соединение: к закрытию NAME базы
+    # может уже смениться (тестовая база в памяти).
+    pool = None
+
+    def get_new_connection(self, conn_params):
+        # База в памяти живёт, пока открыто соединение, — ей пул не нужен.
+        self.pool = None
+        if not self.is_in_memory_db():
+            self.pool = db.get_pool(self.alias, self.settings_dict)
+        if self.pool is None:
+            db.request_stats().opened += 1
+            return super().get_new_connection(conn_params)
+        return self.pool.acquire(
+            lambda: super(DatabaseWrapper, self).get_new_connection(
+                conn_params))
+
+    def _close(self):
+        if self.pool is None or self.connection is None:
+            return super()._close()
+        pool, self.pool = self.pool, None
+        pool.release(self.connection)
+
+    def is_usable(self):
+        return db.is_healthy(self.connection)
@@ -0,0 +1,331 @@
+"""Кэш, общий для всех процессов сервера.
+
+``SQLiteCache`` хранит записи в отдельном файле SQLite (не в базе
+проекта): ``add`` и ``incr`` атомарны между процессами, поэтому на нём
+работают блокировки и версии лент. ``TwoTierCache`` ставит перед общим
+кэшем небольшой LRU в памяти процесса: повторные чтения горячих ключей
+не ходят в файл. Запись в LRU живёт не дольше ``LOCAL_TIMEOUT`` секунд,
+а ключи с префиксами из ``LOCAL_BYPASS`` (версии, счётчики) читаются
+только из общего кэша, так что смена версии сразу видна всем
+процессам.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends import locmem
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from core import perf
+
+# LRU процесса по именам общих кэшей: Django создаёт бэкенд кэша в каждом
+# потоке заново, а LRU нужен один на процесс.
+_local_caches = {}
+_local_caches_lock = threading.Lock()
+
+_MISSING = object()
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache '
+    '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+)
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в файле SQLite ``LOCATION``."""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = location
+        self._local = threading.local()
+
+    def _db(self):
+        # Соединение своё у каждого потока и у каждого процесса после fork.
+        pid, connection = getattr(self._local, 'db', (None, None))
+        if pid != os.getpid():
+            connection = sqlite3.connect(
+                self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._local.db = (os.getpid(), connection)
+        return connection
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        full_keys = {self._key(key, version): key for key in keys}
+        if not full_keys:
+            return {}
+        rows = self._db().execute(
+            'SELECT key, value FROM cache WHERE key IN ({}) '
+            'AND (expires IS NULL OR expires > ?)'.format(
+                ', '.join('?' * len(full_keys))),
+            (*full_keys, time.time()),
+        )
+        return {full_keys[key]: pickle.loads(value) for key, value in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        db = self._db()
+        db.executemany(
+            'INSERT OR REPLACE INTO cache VALUES (?, ?, ?)',
+            [(self._key(key, version),
+              pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires)
+             for key, value in data.items()],
+        )
+        self._cull(db)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self._db().execute(
+            'INSERT INTO cache VALUES (?, ?, ?) ON CONFLICT (key) '
+            'DO UPDATE SET value = excluded.value, expires = excluded.expires '
+            'WHERE cache.expires <= ?',
+            (self._key(key, version),
+             pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+             self.get_backend_timeout(timeout), time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            db.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key))
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self._db().execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), self._key(key, version),
+             time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        full_keys = [self._key(key, version) for key in keys]
+        if full_keys:
+            self._db().execute(
+                'DELETE FROM cache WHERE key IN ({})'.format(
+                    ', '.join('?' * len(full_keys))),
+                full_keys,
+            )
+
+    def has_key(self, key, version=None):
+        return bool(self.get_many([key], version=version))
+
+    def clear(self):
+        self._db().execute('DELETE FROM cache')
+
+    def _cull(self, db):
+        count, = db.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if count <= self._max_entries:
+            return
+        db.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+        # Как у встроенных бэкендов: удаляется каждая CULL_FREQUENCY-я
+        # запись, первыми — с ближайшим сроком, бессрочные — последними.
+        db.execute(
+            'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+            'ORDER BY expires IS NULL, expires LIMIT ?)',
+            (count // self._cull_frequency,),
+        )
+
+
+class LocalLRU:
+    """Ограниченный по числу записей LRU в памяти процесса."""
+
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+        # Значения хранятся в pickle, как в LocMemCache: иначе все
+        # запросы получали бы один и тот же изменяемый объект.
+        return expires, pickle.loads(value)
+
+    def set(self, key, value):
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def discard(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class LookupStatsMixin:
+    """Сообщает ``core.perf`` о попаданиях и промахах чтений."""
+
+    def get(self, key, default=None, version=None):
+        with perf.cache_lookup() as lookup:
+            value = super().get(key, _MISSING, version=version)
+            lookup(value is not _MISSING, 1)
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        with perf.cache_lookup() as lookup:
+            found = super().get_many(keys, version=version)
+            lookup(len(found), len(keys))
+        return found
+
+
+class LocMemCache(LookupStatsMixin, locmem.LocMemCache):
+    """``LocMemCache`` со статистикой попаданий для ``core.perf``."""
+
+
+class TwoTierCache(BaseCache):
+    """LRU процесса перед общим кэшем ``LOCATION`` (имя из ``CACHES``).
+
+    ``OPTIONS``: ``LOCAL_MAX_ENTRIES``, ``LOCAL_TIMEOUT`` и
+    ``LOCAL_BYPASS`` — префиксы ключей, которые в LRU не попадают.
+    Версию и префикс ключа задаёт общий кэш.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = location
+        self.bypass = tuple(options.get('LOCAL_BYPASS', ()))
+        with _local_caches_lock:
+            self.local = _local_caches.setdefault(location, LocalLRU(
+                options.get('LOCAL_MAX_ENTRIES', 1000),
+                options.get('LOCAL_TIMEOUT', 5),
+            ))
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def _local_key(self, key, version):
+        if key.startswith(self.bypass):
+            return None
+        return self.shared.make_key(key, version=version)
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        with perf.cache_lookup() as lookup:
+            found = self._get_many(keys, version)
+            lookup(len(found), len(keys))
+        return found
+
+    def _get_many(self, keys, version):
+        found = {}
+        missing = []
+        for key in keys:
+            local_key = self._local_key(key, version)
+            entry = local_key and self.local.get(local_key)
+            if entry:
+                found[key] = entry[1]
+            else:
+                missing.append(key)
+        if missing:
+            values = self.shared.get_many(missing, version=version)
+            for key, value in values.items():
+                local_key = self._local_key(key, version)
+                if local_key:
+                    self.local.set(local_key, value)
+            found.update(values)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version) or []
+        for key, value in data.items():
+            local_key = self._local_key(key, version)
+            if local_key:
+                self.local.discard(local_key)
+                if key not in failed and timeout != 0:
+                    self.local.set(local_key, value)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._forget(key, version)
+        return self.shared.add(key, value, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._forget(key, version)
+        return self.shared.incr(key, delta, version=version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._forget(key, version)
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._forget(key, version)
+        self.shared.delete_many(keys, version=version)
+
+    def has_key(self, key, version=None):
+        return key in self.get_many([key], version=version)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+    def _forget(self, key, version):
+        local_key = self._local_key(key, version)
+        if local_key:
+            self.local.discard(local_key)
@@ -0,0 +1,71 @@
+"""Кэш без лавины пересчётов при истечении записи.
+
+``get_or_set`` хранит рядом со значением срок его жизни и время, за
+которое оно считалось, и пересчитывает запись чуть раньше срока с
+вероятностью, растущей к его концу (XFetch, Vattani et al.): запросы к
+одной записи почти никогда не приходят к пересчёту одновременно.
+
+Истёкшую или устаревшую по версии запись пересчитывает один запрос —
+тот, кто взял блокировку через ``cache.add``; остальные тем временем
+получают старое значение, которое лежит в кэше ещё ``STALE_TIMEOUT``
+секунд после срока. Без старого значения считают все.
+
+Запрос, который читает с реплики (``core.replicas``), записи только
+читает: посчитанное по отстающей реплике значение под новой версией
+отдавалось бы и тем, кто уже должен видеть изменения.
+"""
+import math
+import random
+import time
+
+from django.core.cache import cache
+
+from core import replicas
+
+LOCK_KEY = '{}:lock'
+# Сколько секунд пересчёт держит блокировку.
+LOCK_TIMEOUT = 10
+# Сколько секунд после срока запись ещё отдаётся, пока её пересчитывают.
+STALE_TIMEOUT = 60
+
+
+def _expires_early(expires, delta, beta):
+    # -log(u) при u из (0, 1] — экспоненциально распределённый запас.
+    gap = -delta * beta * math.log(1 - random.random())
+    return time.time() + gap >= expires
+
+
+def get_or_set(key, compute, timeout, version=None, beta=1.0):
+    """Значение ``key`` из кэша или ``compute()``.
+
+    ``version`` — любое сравнимое значение: запись с другой версией
+    считается устаревшей. ``beta`` больше 1 пересчитывает раньше, 0
+    отключает досрочный пересчёт. ``timeout=None`` — без срока.
+    """
+    entry = cache.get(key)
+    if replicas.reading_replica():
+        if entry is not None and entry[1] == version:
+            return entry[0]
+        return compute()
+    lock = LOCK_KEY.format(key)
+    if entry is not None:
+        value, entry_version, delta, expires = entry
+        if entry_version == version and not _expires_early(
+                expires, delta, beta):
+            return value
+        if not cache.add(lock, 1, LOCK_TIMEOUT):
+            return value
+    else:
+        cache.add(lock, 1, LOCK_TIMEOUT)
+    try:
+        started = time.time()
+        value = compute()
+        delta = time.time() - started
+        if timeout is None:
+            cache.set(key, (value, version, delta, math.inf), None)
+        else:
+            cache.set(key, (value, version, delta, time.time() + timeout),
+                      timeout + STALE_TIMEOUT)
+    finally:
+        cache.delete(lock)
+    return value
@@ -0,0 +1,165 @@
+"""Настройка соединений SQLite.
+
+Прагмы из ключа ``PRAGMAS`` описания базы в ``DATABASES`` выполняются
+на каждом новом соединении: большинство из них (``synchronous``,
+``mmap_size``, ``cache_size``, ``temp_store``) действуют только в
+пределах соединения, поэтому поставить их один раз при миграции нельзя.
+
+Соединения живут по одной из схем (``DB_CONNECTIONS`` в настройках):
+
+* на каждый запрос — новое соединение, как у Django по умолчанию;
+* постоянные (``CONN_MAX_AGE``) — у каждого потока своё; с
+  ``CONN_HEALTH_CHECKS`` перед запросом оно проверяется и при
+  неисправности переоткрывается;
+* пул (ключ ``POOL``) — не больше ``SIZE`` соединений на процесс,
+  общих для всех потоков: поток берёт соединение на время запроса и
+  возвращает его, а если свободных нет, ждёт до ``TIMEOUT`` секунд.
+
+``ConnectionStatsMiddleware`` записывает в лог, сколько соединений
+запрос открыл, сколько взял из пула и сколько ждал пул.
+"""
+import logging
+import sqlite3
+import threading
+import time
+
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+_pools = {}
+_pools_lock = threading.Lock()
+_stats = threading.local()
+
+
+class RequestStats:
+    def __init__(self):
+        self.opened = 0
+        self.reused = 0
+        self.wait = 0.0
+
+
+def request_stats():
+    """Счётчики соединений текущего запроса этого потока."""
+    stats = getattr(_stats, 'current', None)
+    if stats is None:
+        stats = _stats.current = RequestStats()
+    return stats
+
+
+class ConnectionPool:
+    """Ограниченный пул соединений sqlite3 одной базы."""
+
+    def __init__(self, size, timeout):
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self, connect):
+        """Свободное исправное соединение или новое от ``connect()``."""
+        started = time.perf_counter()
+        acquired = self._slots.acquire(timeout=self.timeout)
+        stats = request_stats()
+        stats.wait += time.perf_counter() - started
+        if not acquired:
+            raise sqlite3.OperationalError(
+                f'Нет свободных соединений за {self.timeout} с')
+        try:
+            connection = self._take_healthy()
+            if connection is None:
+                connection = connect()
+                stats.opened += 1
+            else:
+                stats.reused += 1
+        except BaseException:
+            self._slots.release()
+            raise
+        return connection
+
+    def _take_healthy(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                connection = self._idle.pop()
+            if is_healthy(connection):
+                return connection
+            connection.close()
+
+    def release(self, connection):
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+        except sqlite3.Error:
+            connection.close()
+        else:
+            with self._lock:
+                self._idle.append(connection)
+        finally:
+            self._slots.release()
+
+
+def get_pool(alias, settings_dict):
+    """Пул базы ``alias`` или ``None``, если у неё нет ключа ``POOL``."""
+    options = settings_dict.get('POOL')
+    if not options:
+        return None
+    key = (alias, settings_dict['NAME'])
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(
+                options.get('SIZE', 8), options.get('TIMEOUT', 10))
+        return _pools[key]
+
+
+def is_healthy(connection):
+    try:
+        connection.execute('SELECT 1').fetchone()
+    except sqlite3.Error:
+        return False
+    return True
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = connection.settings_dict.get('PRAGMAS') or {}
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def check_connections(**kwargs):
+    # Постоянное соединение могло испортиться, пока поток ждал запроса.
+    for connection in connections.all():
+        if (connection.connection is not None
+                and connection.settings_dict.get('CONN_HEALTH_CHECKS')
+                and not connection.is_usable()):
+            connection.close()
+
+
+def connect_signals():
+    connection_created.connect(
+        apply_pragmas, dispatch_uid='core.db.apply_pragmas')
+    request_started.connect(
+        check_connections, dispatch_uid='core.db.check_connections')
+
+
+class ConnectionStatsMiddleware:
+    """Пишет в лог открытые соединения и ожидание пула за запрос."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = _stats.current = RequestStats()
+        response = self.get_response(request)
+        request.db_connections = stats
+        logger.debug(
+            '%s %s: открыто соединений %d, из пула %d, ожидание пула '
+            '%.1f мс', request.method, request.path, stats.opened,
+            stats.reused, stats.wait * 1000)
+        return response
@@ -0,0 +1,131 @@
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Запись по умолчанию в Python и Django ждёт блокировку 5 секунд.
+DEFAULT_TIMEOUT = 5
+ROWS = 1000
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, text TEXT NOT NULL, '
+    'pub_date REAL NOT NULL)',
+    'CREATE INDEX post_pub_date ON post (pub_date)',
+    'CREATE TABLE counter (id INTEGER PRIMARY KEY, posts INTEGER NOT NULL)',
+)
+
+
+def _connect(path, pragmas, timeout):
+    connection = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+    for name, value in pragmas.items():
+        connection.execute(f'PRAGMA {name} = {value}')
+    return connection
+
+
+def _prepare(path, pragmas, timeout):
+    connection = _connect(path, pragmas, timeout)
+    for statement in SCHEMA:
+        connection.execute(statement)
+    connection.execute('BEGIN')
+    connection.executemany(
+        'INSERT INTO post (text, pub_date) VALUES (?, ?)',
+        ((f'Пост {number}', number) for number in range(ROWS)))
+    connection.execute('INSERT INTO counter VALUES (1, ?)', (ROWS,))
+    connection.execute('COMMIT')
+    connection.close()
+
+
+def _read(connection):
+    # Страница ленты и счётчик, как в index.
+    connection.execute(
+        'SELECT id, text FROM post ORDER BY pub_date DESC LIMIT 10 '
+        'OFFSET ?', (random.randrange(100),)).fetchall()
+    connection.execute('SELECT posts FROM counter').fetchone()
+
+
+def _write(connection):
+    # Новый пост и его счётчик одной транзакцией, как в post_create.
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        connection.execute(
+            'INSERT INTO post (text, pub_date) VALUES (?, ?)',
+            ('Новый пост', time.time()))
+        connection.execute('UPDATE counter SET posts = posts + 1')
+    except sqlite3.Error:
+        connection.execute('ROLLBACK')
+        raise
+    connection.execute('COMMIT')
+
+
+def run_worker(path, pragmas, timeout, writer, seconds):
+    """Гоняет чтения или записи ``seconds`` секунд: (операций, ошибок)."""
+    connection = _connect(path, pragmas, timeout)
+    operation = _write if writer else _read
+    done = errors = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        try:
+            operation(connection)
+        except sqlite3.OperationalError:
+            # «database is locked»: не дождались чужой блокировки.
+            errors += 1
+        else:
+            done += 1
+    connection.close()
+    return done, errors
+
+
+def benchmark(pragmas, timeout, readers, writers, seconds):
+    """Чтений и записей в секунду и число ошибок на свежей базе."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'benchmark.sqlite3')
+        _prepare(path, pragmas, timeout)
+        roles = [False] * readers + [True] * writers
+        with ProcessPoolExecutor(max_workers=len(roles)) as pool:
+            results = list(pool.map(
+                run_worker, repeat(path), repeat(pragmas), repeat(timeout),
+                roles, repeat(seconds)))
+    reads = sum(done for (done, _), writer in zip(results, roles)
+                if not writer)
+    writes = sum(done for (done, _), writer in zip(results, roles)
+                 if writer)
+    errors = sum(failed for _, failed in results)
+    return reads / seconds, writes / seconds, errors
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность SQLite при параллельных '
+            'чтениях и записях с настройками по умолчанию и с '
+            'SQLITE_PRAGMAS.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--readers', type=int, default=4,
+            help='Число читающих процессов.',
+        )
+        parser.add_argument(
+            '--writers', type=int, default=2,
+            help='Число пишущих процессов.',
+        )
+        parser.add_argument(
+            '--seconds', type=float, default=5,
+            help='Сколько секунд длится каждый замер.',
+        )
+
+    def handle(self, *args, readers, writers, seconds, **options):
+        profiles = (
+            ('по умолчанию', {}, DEFAULT_TIMEOUT),
+            ('production', settings.SQLITE_PRAGMAS,
+             settings.SQLITE_BUSY_TIMEOUT),
+        )
+        for name, pragmas, timeout in profiles:
+            reads, writes, errors = benchmark(
+                pragmas, timeout, readers, writers, seconds)
+            self.stdout.write(
+                f'{name}: чтений/с {reads:.0f}, записей/с {writes:.0f}, '
+                f'ошибок блокировки {errors}')
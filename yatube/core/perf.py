@@ -0,0 +1,221 @@
+"""Замеры времени запросов по представлениям.
+
+``PerfMiddleware`` считает для каждого запроса SQL-запросы и их время
+(через ``execute_wrapper`` соединений), попадания и промахи кэша
+(бэкенды из ``core.cache_backends``), время отрисовки шаблонов (бэкенд
+из ``core.template_backends``) и общее время. Итог уходит в заголовок
+``Server-Timing`` — его показывают инструменты разработчика браузера —
+и в гистограммы процесса по имени маршрута. Страница ``/perf/``
+(только для ``INTERNAL_IPS``) показывает по ним p50/p95/p99.
+
+Гистограммы — счётчики в корзинах с границами, растущими в
+``BUCKET_GROWTH`` раз, поэтому запись стоит одного логарифма и
+инкремента, а память не зависит от числа запросов. Погрешность
+процентиля — не больше шага корзины (10 %).
+"""
+import math
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+# Корзины гистограммы в миллисекундах: [0, 0.1), [0.1, 0.11), ...
+BUCKET_START = 0.1
+BUCKET_GROWTH = 1.1
+BUCKETS = 200
+PERCENTILES = (50, 95, 99)
+TIMINGS = ('total', 'db', 'render')
+
+_state = threading.local()
+_routes = {}
+_routes_lock = threading.Lock()
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.render_time = 0.0
+        self.in_cache = False
+        self.in_render = False
+
+    def count_cache(self, hits, total):
+        self.cache_hits += hits
+        self.cache_misses += total - hits
+
+    def __call__(self, execute, sql, params, many, context):
+        """``execute_wrapper``: время каждого SQL-запроса."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+
+    def add(self, milliseconds):
+        if milliseconds < BUCKET_START:
+            index = 0
+        else:
+            index = min(BUCKETS - 1, 1 + int(math.log(
+                milliseconds / BUCKET_START, BUCKET_GROWTH)))
+        self.counts[index] += 1
+
+    def percentile(self, percent):
+        """Верхняя граница корзины, в которую попал процентиль, мс."""
+        total = sum(self.counts)
+        if not total:
+            return 0.0
+        rank = math.ceil(total * percent / 100)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return BUCKET_START * BUCKET_GROWTH ** index
+        return BUCKET_START * BUCKET_GROWTH ** (BUCKETS - 1)
+
+
+class RouteStats:
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.timings = {name: Histogram() for name in TIMINGS}
+
+    def add(self, metrics, total):
+        self.requests += 1
+        self.queries += metrics.queries
+        self.cache_hits += metrics.cache_hits
+        self.cache_misses += metrics.cache_misses
+        self.timings['total'].add(total * 1000)
+        self.timings['db'].add(metrics.db_time * 1000)
+        self.timings['render'].add(metrics.render_time * 1000)
+
+
+@contextmanager
+def measure():
+    """Собирает ``RequestMetrics`` для кода внутри блока в этом потоке."""
+    metrics = _state.metrics = RequestMetrics()
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(metrics))
+            yield metrics
+    finally:
+        _state.metrics = None
+
+
+def _ignore(hits, total):
+    pass
+
+
+@contextmanager
+def cache_lookup():
+    """Отдаёт функцию учёта попаданий; вложенные чтения не считаются.
+
+    Бэкенды кэша реализуют ``get`` через ``get_many`` или наоборот, а
+    учесть чтение нужно один раз.
+    """
+    metrics = getattr(_state, 'metrics', None)
+    if metrics is None or metrics.in_cache:
+        yield _ignore
+        return
+    metrics.in_cache = True
+    try:
+        yield metrics.count_cache
+    finally:
+        metrics.in_cache = False
+
+
+@contextmanager
+def rendering():
+    """Засекает отрисовку шаблона; вложенные отрисовки уже внутри."""
+    metrics = getattr(_state, 'metrics', None)
+    if metrics is None or metrics.in_render:
+        yield
+        return
+    metrics.in_render = True
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.render_time += time.perf_counter() - started
+        metrics.in_render = False
+
+
+def record(route, metrics, total):
+    with _routes_lock:
+        stats = _routes.get(route)
+        if stats is None:
+            stats = _routes[route] = RouteStats()
+        stats.add(metrics, total)
+
+
+def snapshot():
+    """Сводка по маршрутам: имя → словарь со средними и процентилями."""
+    with _routes_lock:
+        routes = list(_routes.items())
+        summary = {}
+        for route, stats in sorted(routes):
+            lookups = stats.cache_hits + stats.cache_misses
+            row = {
+                'requests': stats.requests,
+                'queries': stats.queries / stats.requests,
+                'cache_hit_ratio': (
+                    stats.cache_hits / lookups if lookups else None),
+            }
+            for name, histogram in stats.timings.items():
+                for percent in PERCENTILES:
+                    row[f'{name}_p{percent}'] = histogram.percentile(
+                        percent)
+            summary[route] = row
+    return summary
+
+
+def reset():
+    with _routes_lock:
+        _routes.clear()
+
+
+def server_timing(metrics, total, db_connections=None):
+    entries = [
+        f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} '
+        f'queries"',
+        f'cache;desc="{metrics.cache_hits} hits, '
+        f'{metrics.cache_misses} misses"',
+        f'render;dur={metrics.render_time * 1000:.1f}',
+    ]
+    if db_connections is not None:
+        entries.append(
+            f'db-pool;dur={db_connections.wait * 1000:.1f};'
+            f'desc="{db_connections.opened} opened, '
+            f'{db_connections.reused} reused"')
+    entries.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(entries)
+
+
+class PerfMiddleware:
+    """Замеряет запрос; ставится первым в ``MIDDLEWARE``."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with measure() as metrics:
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+        response['Server-Timing'] = server_timing(
+            metrics, total, getattr(request, 'db_connections', None))
+        match = request.resolver_match
+        if match is not None:
+            record(match.view_name, metrics, total)
+        return response
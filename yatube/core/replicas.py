@@ -0,0 +1,86 @@
+"""Чтение лент с реплик базы.
+
+``ReplicaMiddleware`` отправляет на реплику из ``DATABASE_REPLICAS``
+чтения GET-запросов к маршрутам ``REPLICA_ROUTES``; всё остальное, в том
+числе любые записи, идёт в основную базу. ``ReplicaRouter`` отмечает
+каждую запись, и после запроса, который что-то записал, пользователь
+получает cookie: ``REPLICA_PIN_SECONDS`` секунд (дольше, чем отстаёт
+реплика) все его запросы читают основную базу, поэтому свои посты,
+комментарии и подписки он видит сразу.
+
+Страница, прочитанная с отстающей реплики, может не содержать последних
+изменений, хотя версии лент (они в кэше, а не в базе) уже новые. Поэтому
+такой запрос не сохраняет ни фрагменты, ни страницы под этими версиями
+и не отдаёт ETag: иначе устаревший HTML жил бы до следующего изменения,
+и автор не увидел бы своей записи. Запрос, который всё-таки должен
+заполнить кэш, переключается на основную базу через ``use_primary``.
+
+Без реплик в настройках маршрутизация ничего не меняет.
+"""
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'primary_db'
+
+_state = threading.local()
+
+
+def reading_replica():
+    """Читает ли текущий запрос этого потока с реплики."""
+    return getattr(_state, 'replica', None) is not None
+
+
+def use_primary():
+    """Дальше в этом запросе читать основную базу."""
+    _state.replica = None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return getattr(_state, 'replica', None)
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # В репликах те же данные, что и в основной базе.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    """Выбирает базу для чтения на время запроса.
+
+    Ставится до ``SessionMiddleware``, чтобы замечать и запись сессии.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.replica = None
+        _state.wrote = False
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.replica = None
+        if _state.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (settings.DATABASE_REPLICAS
+                and request.method in ('GET', 'HEAD')
+                and PIN_COOKIE not in request.COOKIES
+                and request.resolver_match.view_name
+                in settings.REPLICA_ROUTES):
+            _state.replica = random.choice(settings.DATABASE_REPLICAS)
+        return None
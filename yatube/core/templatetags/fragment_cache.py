@@ -0,0 +1,65 @@
+"""Замена ``{% load cache %}`` без лавины пересчётов.
+
+Синтаксис тот же, что у встроенного тега, плюс необязательная версия::
+
+    {% load fragment_cache %}
+    {% cache 500 sidebar request.user.username version=sidebar_version %}
+        ...
+    {% endcache %}
+
+Фрагмент с другой версией считается устаревшим, но пока его
+перерисовывает один запрос, остальные получают старую копию
+(см. ``core.caching``).
+"""
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+from core.caching import get_or_set
+
+register = template.Library()
+
+
+class FragmentCacheNode(template.Node):
+    def __init__(self, nodelist, timeout, name, vary_on, version):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.name = name
+        self.vary_on = vary_on
+        self.version = version
+
+    def render(self, context):
+        timeout = self.timeout.resolve(context)
+        if timeout is not None:
+            try:
+                timeout = int(timeout)
+            except (ValueError, TypeError):
+                raise template.TemplateSyntaxError(
+                    f'"cache" tag got a non-integer timeout value: '
+                    f'{timeout!r}')
+        key = make_template_fragment_key(
+            self.name, [var.resolve(context) for var in self.vary_on])
+        version = None
+        if self.version is not None:
+            version = self.version.resolve(context)
+        return get_or_set(
+            key, lambda: self.nodelist.render(context), timeout, version)
+
+
+@register.tag('cache')
+def do_cache(parser, token):
+    nodelist = parser.parse(('endcache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            f"'{tokens[0]}' tag requires at least 2 arguments.")
+    version = None
+    if tokens[-1].startswith('version='):
+        version = parser.compile_filter(tokens.pop()[len('version='):])
+    return FragmentCacheNode(
+        nodelist,
+        parser.compile_filter(tokens[1]),
+        tokens[2],
+        [parser.compile_filter(token) for token in tokens[3:]],
+        version,
+    )
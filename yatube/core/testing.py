@@ -0,0 +1,30 @@
+"""Помощники для тестов: бюджет SQL-запросов на представление."""
+from contextlib import contextmanager
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """Проверка «не больше N запросов» для ``TestCase``.
+
+    В отличие от ``assertNumQueries`` бюджет — это верхняя граница: тест
+    не ломается, когда представление становится дешевле, но падает с
+    перечнем выполненных запросов, как только их становится больше.
+    """
+
+    @contextmanager
+    def assertQueryBudget(self, budget, using='default', msg=None):
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+        executed = len(context.captured_queries)
+        if executed > budget:
+            queries = '\n'.join(
+                f'{number}. {query["sql"]}'
+                for number, query in enumerate(context.captured_queries, 1)
+            )
+            self.fail(self._formatMessage(
+                msg,
+                f'{executed} queries executed, budget is {budget}:\n'
+                f'{queries}'
+            ))
@@ -0,0 +1,137 @@
+import shutil
+import tempfile
+from multiprocessing import get_context
+from os import path
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from core import cache_backends, perf
+
+TEMP_DIR = tempfile.mkdtemp()
+SHARED_PATH = path.join(TEMP_DIR, 'cache.sqlite3')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache_backends.TwoTierCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {'LOCAL_BYPASS': ('feed-version:',)},
+    },
+    'shared': {
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': SHARED_PATH,
+        'OPTIONS': {'MAX_ENTRIES': 10},
+    },
+}
+
+
+def tearDownModule():
+    shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+
+def increment(times):
+    cache = cache_backends.SQLiteCache(SHARED_PATH, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+@override_settings(CACHES=CACHES)
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.cache = caches['shared']
+        self.cache.clear()
+
+    def test_set_get_delete(self):
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_expired_entry_is_missing(self):
+        self.cache.set('key', 1, -1)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 2))
+        self.assertEqual(self.cache.get('key'), 2)
+
+    def test_add_does_not_overwrite(self):
+        self.assertTrue(self.cache.add('key', 1))
+        self.assertFalse(self.cache.add('key', 2))
+        self.assertEqual(self.cache.get('key'), 1)
+
+    def test_incr(self):
+        with self.assertRaises(ValueError):
+            self.cache.incr('key')
+        self.cache.set('key', 1)
+        self.assertEqual(self.cache.incr('key', 2), 3)
+        self.assertEqual(self.cache.decr('key'), 2)
+
+    def test_incr_is_atomic_across_processes(self):
+        self.cache.set('counter', 0)
+        context = get_context('fork')
+        workers = [
+            context.Process(target=increment, args=(50,)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_cull(self):
+        self.cache.set_many({f'key{number}': number for number in range(12)})
+        self.cache.set('last', 1)
+        self.assertLessEqual(
+            len(self.cache.get_many([f'key{number}' for number in range(12)])),
+            10)
+        self.assertEqual(self.cache.get('last'), 1)
+
+
+@override_settings(CACHES=CACHES)
+class TwoTierCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.cache = caches['default']
+        self.cache.clear()
+        self.shared = caches['shared']
+
+    def test_reads_are_served_locally(self):
+        self.cache.set('key', 1)
+        # Так выглядит запись из другого процесса: LRU о ней не знает.
+        self.shared.set('key', 2)
+        self.assertEqual(self.cache.get('key'), 1)
+        self.cache.local.clear()
+        self.assertEqual(self.cache.get('key'), 2)
+
+    def test_bypassed_keys_are_always_shared(self):
+        self.cache.set('feed-version:index', 1)
+        self.shared.incr('feed-version:index')
+        self.assertEqual(self.cache.get('feed-version:index'), 2)
+
+    def test_local_copy_is_not_shared_between_reads(self):
+        self.cache.set('key', [])
+        self.cache.get('key').append(1)
+        self.assertEqual(self.cache.get('key'), [])
+
+    def test_lookups_are_counted_once(self):
+        self.cache.set('key', 1)
+        with perf.measure() as metrics:
+            self.cache.get('key')
+            self.cache.get('missing')
+            self.cache.get_many(['key', 'missing'])
+        self.assertEqual((metrics.cache_hits, metrics.cache_misses), (2, 2))
+
+    def test_writes_go_through(self):
+        self.cache.set('key', 1)
+        self.cache.incr('key')
+        self.assertEqual(self.shared.get('key'), 2)
+        self.assertEqual(self.cache.get('key'), 2)
+        self.assertFalse(self.cache.add('key', 5))
+        self.cache.delete('key')
+        self.assertIsNone(self.shared.get('key'))
+
+    def test_local_lru_is_bounded(self):
+        lru = cache_backends.LocalLRU(max_entries=2, timeout=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('a')[1], 1)
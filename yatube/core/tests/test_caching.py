@@ -0,0 +1,95 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.template import Context, Template, TemplateSyntaxError
+from django.test import SimpleTestCase
+
+from core import caching
+
+
+class GetOrSetTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.compute = mock.Mock(side_effect=['первое', 'второе'])
+
+    def test_value_is_cached(self):
+        self.assertEqual(caching.get_or_set('key', self.compute, 60), 'первое')
+        self.assertEqual(caching.get_or_set('key', self.compute, 60), 'первое')
+        self.compute.assert_called_once()
+
+    def test_new_version_recomputes(self):
+        caching.get_or_set('key', self.compute, 60, version=1)
+        self.assertEqual(
+            caching.get_or_set('key', self.compute, 60, version=2), 'второе')
+
+    def test_stale_value_served_while_locked(self):
+        caching.get_or_set('key', self.compute, 60, version=1)
+        cache.add(caching.LOCK_KEY.format('key'), 1)
+        self.assertEqual(
+            caching.get_or_set('key', self.compute, 60, version=2), 'первое')
+        self.compute.assert_called_once()
+
+    def test_lock_released_after_error(self):
+        with self.assertRaises(ZeroDivisionError):
+            caching.get_or_set('key', lambda: 1 / 0, 60)
+        self.assertIsNone(cache.get(caching.LOCK_KEY.format('key')))
+
+    def test_replica_reads_but_does_not_store(self):
+        caching.get_or_set('key', self.compute, 60, version=1)
+        with mock.patch('core.replicas.reading_replica', return_value=True):
+            self.assertEqual(
+                caching.get_or_set('key', self.compute, 60, version=1),
+                'первое')
+            self.assertEqual(
+                caching.get_or_set('key', self.compute, 60, version=2),
+                'второе')
+        self.assertEqual(cache.get('key')[:2], ('первое', 1))
+
+    def at(self, moment):
+        clock = mock.patch('core.caching.time')
+        clock.start().time.return_value = moment
+        self.addCleanup(clock.stop)
+
+    def test_recomputes_early_near_expiry(self):
+        self.at(1000)
+        caching.get_or_set('key', self.compute, 60)
+        # До срока 1 с, расчёт занял 1 с, запас при u = 0.01 — 4,6 с.
+        value, version, delta, expires = cache.get('key')
+        cache.set('key', (value, version, 1.0, expires))
+        self.at(1059)
+        with mock.patch('core.caching.random.random', return_value=0.99):
+            self.assertEqual(
+                caching.get_or_set('key', self.compute, 60), 'второе')
+
+    def test_beta_zero_disables_early_recompute(self):
+        self.at(1000)
+        caching.get_or_set('key', self.compute, 60)
+        self.at(1059)
+        with mock.patch('core.caching.random.random', return_value=0.99):
+            self.assertEqual(
+                caching.get_or_set('key', self.compute, 60, beta=0),
+                'первое')
+
+
+class FragmentCacheTagTest(SimpleTestCase):
+    template = Template(
+        '{% load fragment_cache %}'
+        '{% cache 60 fragment name version=version %}'
+        '{{ value }}{% endcache %}'
+    )
+
+    def setUp(self):
+        cache.clear()
+
+    def render(self, **context):
+        return self.template.render(Context(context))
+
+    def test_fragment_is_cached_per_version(self):
+        self.assertEqual(self.render(name='a', version=1, value='1'), '1')
+        self.assertEqual(self.render(name='a', version=1, value='2'), '1')
+        self.assertEqual(self.render(name='b', version=1, value='3'), '3')
+        self.assertEqual(self.render(name='a', version=2, value='4'), '4')
+
+    def test_requires_name(self):
+        with self.assertRaises(TemplateSyntaxError):
+            Template('{% load fragment_cache %}{% cache 60 %}{% endcache %}')
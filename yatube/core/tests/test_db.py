@@ -0,0 +1,124 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import OperationalError, connections
+from django.test import SimpleTestCase, TestCase
+
+from core import db
+from core.backends.sqlite3.base import DatabaseWrapper
+
+
+class FileDatabaseMixin:
+    """Соединения с временным файлом базы вместо тестовой базы в памяти."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'db.sqlite3')
+
+    def connect(self, alias='file', **extra):
+        settings_dict = {
+            **connections['default'].settings_dict,
+            'NAME': self.path,
+            'POOL': None,
+            **extra,
+        }
+        connection = DatabaseWrapper(settings_dict, alias=alias)
+        self.addCleanup(connection.close)
+        return connection
+
+
+class PragmasTest(FileDatabaseMixin, SimpleTestCase):
+
+    def pragma(self, connection, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_applied_to_new_connections(self):
+        connection = self.connect(PRAGMAS=settings.SQLITE_PRAGMAS)
+        self.assertEqual(self.pragma(connection, 'journal_mode'), 'wal')
+        # 1 — NORMAL, 2 — MEMORY.
+        self.assertEqual(self.pragma(connection, 'synchronous'), 1)
+        self.assertEqual(self.pragma(connection, 'temp_store'), 2)
+        self.assertEqual(
+            self.pragma(connection, 'cache_size'),
+            settings.SQLITE_PRAGMAS['cache_size'])
+
+    def test_without_pragmas_defaults_stay(self):
+        connection = self.connect(PRAGMAS={})
+        self.assertEqual(self.pragma(connection, 'journal_mode'), 'delete')
+
+
+class PoolTest(FileDatabaseMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.stats = db._stats.current = db.RequestStats()
+        self.addCleanup(db._pools.pop, ('pooled', self.path), None)
+
+    def connect(self, size=2, timeout=1):
+        connection = super().connect(
+            'pooled', POOL={'SIZE': size, 'TIMEOUT': timeout})
+        connection.ensure_connection()
+        return connection
+
+    def test_connection_is_reused(self):
+        first = self.connect()
+        raw = first.connection
+        first.close()
+        second = self.connect()
+        self.assertIs(second.connection, raw)
+        self.assertEqual((self.stats.opened, self.stats.reused), (1, 1))
+
+    def test_pool_is_bounded(self):
+        first = self.connect(size=1, timeout=0.05)
+        with self.assertRaises(OperationalError):
+            self.connect(size=1, timeout=0.05)
+        self.assertGreaterEqual(self.stats.wait, 0.05)
+        first.close()
+        self.connect(size=1, timeout=0.05)
+
+    def test_broken_connection_is_replaced(self):
+        first = self.connect()
+        raw = first.connection
+        first.close()
+        raw.close()
+        second = self.connect()
+        self.assertIsNot(second.connection, raw)
+        self.assertTrue(second.is_usable())
+        self.assertEqual(self.stats.opened, 2)
+
+    def test_transaction_is_rolled_back_on_release(self):
+        first = self.connect()
+        with first.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id INTEGER)')
+        first.connection.execute('BEGIN')
+        first.connection.execute('INSERT INTO item VALUES (1)')
+        first.close()
+        second = self.connect()
+        with second.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM item')
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+
+class ConnectionStatsMiddlewareTest(TestCase):
+    def test_stats_are_logged(self):
+        with self.assertLogs(db.logger, 'DEBUG') as logs:
+            response = self.client.get('/')
+        self.assertIsInstance(
+            response.wsgi_request.db_connections, db.RequestStats)
+        self.assertIn('GET /: открыто соединений', logs.output[0])
+
+
+class BenchmarkCommandTest(SimpleTestCase):
+    def test_reports_both_profiles(self):
+        out = StringIO()
+        call_command('benchmark_db', readers=1, writers=1, seconds=0.2,
+                     stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith('по умолчанию: чтений/с'))
+        self.assertTrue(lines[1].startswith('production: чтений/с'))
@@ -0,0 +1,71 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import perf
+from posts.models import Post
+
+User = get_user_model()
+
+
+class HistogramTest(SimpleTestCase):
+    def test_percentiles_within_bucket_error(self):
+        histogram = perf.Histogram()
+        for milliseconds in range(1, 101):
+            histogram.add(milliseconds)
+        for percent in perf.PERCENTILES:
+            with self.subTest(percent=percent):
+                value = histogram.percentile(percent)
+                self.assertGreaterEqual(value, percent)
+                self.assertLessEqual(value, percent * perf.BUCKET_GROWTH)
+
+    def test_empty_and_extreme_values(self):
+        histogram = perf.Histogram()
+        self.assertEqual(histogram.percentile(50), 0)
+        histogram.add(0)
+        histogram.add(10 ** 12)
+        self.assertEqual(histogram.percentile(50), perf.BUCKET_START)
+        self.assertGreater(histogram.percentile(99), 10 ** 6)
+
+
+class PerfMiddlewareTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='author')
+        Post.objects.create(author=author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        perf.reset()
+
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:index'))
+        timing = response['Server-Timing']
+        self.assertIn(f'desc="{len(queries)} queries"', timing)
+        for name in ('db;dur=', 'cache;desc=', 'render;dur=', 'total;dur='):
+            self.assertIn(name, timing)
+        self.assertNotIn('desc="0 hits, 0 misses"', timing)
+
+    def test_routes_are_aggregated(self):
+        for _ in range(3):
+            self.client.get(reverse('posts:index'))
+        self.client.get('/missing-page/')
+        summary = perf.snapshot()
+        self.assertEqual(summary['posts:index']['requests'], 3)
+        self.assertGreater(summary['posts:index']['render_p95'], 0)
+        self.assertEqual(list(summary), ['posts:index'])
+
+    def test_stats_page_is_local_only(self):
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('perf'))
+        self.assertContains(response, 'posts:index\t1\t')
+        response = self.client.get(
+            reverse('perf'), HTTP_X_FORWARDED_FOR='203.0.113.1')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('perf'), REMOTE_ADDR='203.0.113.1')
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,126 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, connections, router
+from django.http import HttpResponse
+from django.test import (Client, RequestFactory, SimpleTestCase,
+                         TransactionTestCase, override_settings)
+from django.urls import resolve, reverse
+
+from core.replicas import PIN_COOKIE, ReplicaMiddleware
+from posts.models import Post
+
+User = get_user_model()
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_PIN_SECONDS=10)
+class ReplicaRoutingTest(SimpleTestCase):
+    def request(self, url, method='get', write=False, cookies=None):
+        """Прогоняет запрос через middleware: (база чтения, ответ)."""
+        request = getattr(RequestFactory(), method)(url)
+        request.COOKIES.update(cookies or {})
+        request.resolver_match = resolve(url)
+        used = {}
+
+        def view(request):
+            used['read'] = router.db_for_read(Post)
+            if write:
+                used['write'] = router.db_for_write(Post)
+            return HttpResponse()
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+
+        middleware = ReplicaMiddleware(get_response)
+        response = middleware(request)
+        if write:
+            self.assertEqual(used['write'], 'default')
+        return used['read'], response
+
+    def test_feeds_read_from_replica(self):
+        for url in (reverse('posts:index'),
+                    reverse('posts:group_list', args=('slug',)),
+                    reverse('posts:profile', args=('user',)),
+                    reverse('posts:follow_index')):
+            with self.subTest(url=url):
+                self.assertEqual(self.request(url)[0], 'replica1')
+        self.assertEqual(router.db_for_read(Post), 'default')
+
+    def test_other_views_read_from_primary(self):
+        for url in (reverse('posts:post_create'),
+                    reverse('posts:post_detail', args=(1,))):
+            with self.subTest(url=url):
+                self.assertEqual(self.request(url)[0], 'default')
+        self.assertEqual(
+            self.request(reverse('posts:index'), method='post')[0],
+            'default')
+
+    def test_write_pins_user_to_primary(self):
+        _, response = self.request(
+            reverse('posts:add_comment', args=(1,)), method='post',
+            write=True)
+        cookie = response.cookies[PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], 10)
+        read, response = self.request(
+            reverse('posts:index'), cookies={PIN_COOKIE: cookie.value})
+        self.assertEqual(read, 'default')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        read, response = self.request(reverse('posts:index'), write=True)
+        self.assertEqual(read, 'default')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+@override_settings(DATABASE_REPLICAS=['stale'])
+class StaleReplicaTest(TransactionTestCase):
+    """Реплика — копия базы, снятая до последнего поста."""
+
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user(username='author')
+        Post.objects.create(author=author, text='Старый пост')
+        self.reader_client = Client()
+        self.reader_client.force_login(
+            User.objects.create_user(username='reader'))
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'replica.sqlite3')
+        connection.ensure_connection()
+        replica = sqlite3.connect(path)
+        connection.connection.backup(replica)
+        replica.close()
+        connections.databases['stale'] = {
+            **connection.settings_dict, 'NAME': path}
+        self.addCleanup(self.remove_replica)
+        Post.objects.create(author=author, text='Новый пост')
+
+    def remove_replica(self):
+        connections['stale'].close()
+        del connections.databases['stale']
+        if hasattr(connections._connections, 'stale'):
+            delattr(connections._connections, 'stale')
+
+    def test_replica_page_does_not_fill_caches(self):
+        url = reverse('posts:index')
+        response = self.reader_client.get(url)
+        self.assertNotContains(response, 'Новый пост')
+        self.assertFalse(response.has_header('ETag'))
+        # Автор записи читает основную базу и видит её, а не копию
+        # фрагмента, отрисованную по реплике.
+        self.reader_client.cookies[PIN_COOKIE] = '1'
+        response = self.reader_client.get(url)
+        self.assertContains(response, 'Новый пост')
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_page_cache_is_rebuilt_from_primary(self):
+        url = reverse('posts:index')
+        for _ in range(2):
+            response = Client().get(url)
+            self.assertContains(response, 'Новый пост')
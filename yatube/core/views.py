@@ -1,5 +1,9 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 
+from core import perf
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -15,3 +19,30 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def perf_stats(request):
+    """Процентили времени запросов по маршрутам, только для своих."""
+    # За прокси REMOTE_ADDR — адрес самого прокси, такие запросы чужие.
+    if (request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS
+            or 'HTTP_X_FORWARDED_FOR' in request.META):
+        raise Http404
+    lines = [
+        'маршрут\tзапросов\tSQL\tкэш\tp50\tp95\tp99\tБД p95\t'
+        'шаблоны p95',
+    ]
+    for route, row in perf.snapshot().items():
+        ratio = row['cache_hit_ratio']
+        lines.append('\t'.join((
+            route,
+            str(row['requests']),
+            f'{row["queries"]:.1f}',
+            '-' if ratio is None else f'{ratio:.0%}',
+            f'{row["total_p50"]:.1f}',
+            f'{row["total_p95"]:.1f}',
+            f'{row["total_p99"]:.1f}',
+            f'{row["db_p95"]:.1f}',
+            f'{row["render_p95"]:.1f}',
+        )))
+    return HttpResponse(
+        '\n'.join(lines) + '\n', content_type='text/plain; charset=utf-8')
@@ -1,8 +1,18 @@
 from django.contrib import admin
 
+from . import search
 from .models import Group, Post, Comment, Follow
 
 
+class FullTextSearchMixin:
+    """Поиск в списке объектов через полнотекстовый индекс."""
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return search.match(queryset, search_term), False
+
+
 class GroupAdmin(admin.ModelAdmin):
     list_display = (
         'pk',
@@ -12,7 +22,7 @@ class GroupAdmin(admin.ModelAdmin):
     )
 
 
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = (
         'pk',
         'text',
@@ -26,7 +36,7 @@ class PostAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = (
         'pk',
         'text',
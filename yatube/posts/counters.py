@@ -0,0 +1,65 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются атомарными ``UPDATE ... SET x = x + 1`` в обработчиках
+сигналов, поэтому шаблоны читают готовую колонку вместо ``COUNT(*)``.
+Расхождения исправляет команда ``recount``.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Group, Post, UserCounter
+
+User = get_user_model()
+
+
+def _shift(queryset, **deltas):
+    # Не уводим счётчик в минус, если он уже разошёлся с данными.
+    queryset = queryset.filter(**{
+        f'{field}__gte': -delta
+        for field, delta in deltas.items() if delta < 0
+    })
+    queryset.update(**{
+        field: F(field) + delta for field, delta in deltas.items()
+    })
+
+
+def shift_user(user_id, **deltas):
+    _shift(UserCounter.objects.filter(user_id=user_id), **deltas)
+
+
+def shift_group(group_id, delta):
+    if group_id is not None:
+        _shift(Group.objects.filter(pk=group_id), posts_count=delta)
+
+
+def shift_post(post_id, delta):
+    _shift(Post.objects.filter(pk=post_id), comments_count=delta)
+
+
+def _count(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+@transaction.atomic
+def recount():
+    """Пересчитывает все счётчики по исходным таблицам."""
+    UserCounter.objects.bulk_create(
+        (UserCounter(user_id=user_id) for user_id in User.objects.filter(
+            counters__isnull=True).values_list('pk', flat=True)),
+        ignore_conflicts=True,
+    )
+    Group.objects.update(posts_count=_count(Post.objects, 'group'))
+    Post.objects.update(comments_count=_count(Comment.objects, 'post'))
+    UserCounter.objects.update(
+        posts_count=_count(Post.objects, 'author'),
+        followers_count=_count(Follow.objects, 'author'),
+        following_count=_count(Follow.objects, 'user'),
+    )
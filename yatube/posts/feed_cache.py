@@ -0,0 +1,214 @@
+"""Версии лент для фрагментного кэша шаблонов.
+
+Ключ кэша ленты складывается из её области (``index``, ``group:<slug>``,
+``profile:<username>``) и параметров страницы, а рядом с фрагментом
+хранится версия области. Сохранение или удаление поста или группы
+увеличивает версию затронутых областей, поэтому устаревшие фрагменты
+перерисовываются и время жизни кэша можно делать большим. Комментарий
+меняет только страницу своего поста (``post:<id>``): в лентах число
+комментариев не показывается.
+
+Те же версии вместе со временем последнего изменения области служат
+валидаторами условных GET-запросов (``conditional_feed``): ответ 304
+отдаётся без рендеринга шаблона и, для лент, без запросов к базе.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import DEFERRED
+from django.views.decorators.http import condition
+
+from .models import Group
+from core import replicas
+
+User = get_user_model()
+
+VERSION_KEY = 'feed-version:{}'
+MODIFIED_KEY = 'feed-modified:{}'
+INDEX = 'index'
+# Рекомендации подписок; меняются командой compute_suggestions.
+SUGGESTIONS = 'suggestions'
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def profile_scope(username):
+    return f'profile:{username}'
+
+
+def post_scope(post_id):
+    """Страница поста: меняют комментарии к нему."""
+    return f'post:{post_id}'
+
+
+def timeline_scope(user_id):
+    """Подписки пользователя: меняет ленту ``follow/``."""
+    return f'timeline:{user_id}'
+
+
+def _initial_version():
+    # После вытеснения ключа версия начинается с нового значения
+    # и не совпадает ни с одной из выданных ранее.
+    return int(time.time() * 1000)
+
+
+def get_version(scope):
+    key = VERSION_KEY.format(quote(scope))
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump(*scopes):
+    """Увеличивает версии областей сейчас и повторно после коммита.
+
+    Иначе параллельный запрос успел бы взять новую версию, отрисовать
+    ещё не закоммиченное состояние и сохранить его под этой версией.
+    """
+    scopes = set(scopes)
+    _bump(scopes)
+    transaction.on_commit(lambda: _bump(scopes))
+
+
+def _bump(scopes):
+    now = time.time()
+    for scope in scopes:
+        key = VERSION_KEY.format(quote(scope))
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), None)
+        cache.set(MODIFIED_KEY.format(quote(scope)), now, None)
+
+
+def get_state(scopes):
+    """Версии областей и время последнего изменения любой из них.
+
+    Всё читается одним ``get_many``; для вытесненных ключей время
+    изменения считается текущим.
+    """
+    keys = {}
+    for scope in scopes:
+        keys[scope] = (VERSION_KEY.format(quote(scope)),
+                       MODIFIED_KEY.format(quote(scope)))
+    values = cache.get_many([key for pair in keys.values() for key in pair])
+    versions = []
+    modified = 0
+    for scope, (version_key, modified_key) in keys.items():
+        version = values.get(version_key)
+        if version is None:
+            version = get_version(scope)
+        if modified_key not in values:
+            cache.add(modified_key, time.time(), None)
+            values[modified_key] = cache.get(modified_key, time.time())
+        versions.append(version)
+        modified = max(modified, values[modified_key])
+    return versions, modified
+
+
+def post_scopes(author_id, *group_ids):
+    """Области лент, в которых показываются посты автора и групп."""
+    scopes = [INDEX]
+    scopes.extend(
+        profile_scope(username) for username in User.objects.filter(
+            pk=author_id).values_list('username', flat=True)
+    )
+    scopes.extend(
+        group_scope(slug) for slug in Group.objects.filter(
+            pk__in=[pk for pk in group_ids if pk not in (None, DEFERRED)]
+        ).values_list('slug', flat=True)
+    )
+    return scopes
+
+
+def with_viewer(request, *scopes):
+    """Области ленты с кнопками подписки: плюс подписки зрителя."""
+    if request.user.is_authenticated:
+        return [*scopes, timeline_scope(request.user.pk)]
+    return list(scopes)
+
+
+def feed_cache_context(request, scope, per_viewer=False):
+    """Контекст для тега ``cache`` из ``fragment_cache``::
+
+        {% cache feed_cache_timeout feed feed_cache_key
+           version=feed_cache_version %}
+
+    Версия не входит в ключ: после изменения ленты старый фрагмент
+    отдаётся, пока его перерисовывает один запрос. ``per_viewer`` —
+    во фрагменте кнопки подписки: вошедшие пользователи получают свои
+    копии, которые меняются и с их подписками.
+    """
+    parts = [scope, request.GET.urlencode()]
+    version = get_version(scope)
+    if per_viewer and request.user.is_authenticated:
+        parts.append(str(request.user.pk))
+        version = (version, get_version(timeline_scope(request.user.pk)))
+    return {
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+        'feed_cache_key': ':'.join(parts),
+        'feed_cache_version': version,
+    }
+
+
+def follow_scopes(user_id, author_id):
+    """Области, которые меняет подписка: профили обоих и лента подписок."""
+    return [timeline_scope(user_id)] + [
+        profile_scope(username) for username in User.objects.filter(
+            pk__in=(user_id, author_id)).values_list('username', flat=True)
+    ]
+
+
+def _validators(request, scopes):
+    """ETag и Last-Modified страницы из областей ``scopes``."""
+    # Страница с реплики может отставать от версий: по ETag её
+    # подтверждали бы до следующего изменения.
+    if scopes is None or replicas.reading_replica():
+        return None, None
+    versions, modified = get_state(scopes)
+    # Страница зависит ещё от параметров и от того, кто смотрит:
+    # в шапке имя пользователя, в профиле — кнопка подписки.
+    viewer = request.user.pk if request.user.is_authenticated else ''
+    raw = '|'.join(map(str, (
+        *scopes, *versions, request.GET.urlencode(), viewer)))
+    return (hashlib.md5(raw.encode()).hexdigest(),
+            datetime.fromtimestamp(modified, timezone.utc))
+
+
+def conditional_feed(get_scopes):
+    """Условный GET для страницы, собранной из областей ``get_scopes``.
+
+    ``get_scopes(request, *args, **kwargs)`` возвращает список областей
+    или ``None``, если валидаторов нет и страницу надо отрисовать.
+    """
+    def validators(request, *args, **kwargs):
+        # condition() спрашивает ETag и Last-Modified по отдельности.
+        if not hasattr(request, '_feed_validators'):
+            request._feed_validators = _validators(
+                request, get_scopes(request, *args, **kwargs))
+        return request._feed_validators
+
+    def etag(request, *args, **kwargs):
+        return validators(request, *args, **kwargs)[0]
+
+    def last_modified(request, *args, **kwargs):
+        return validators(request, *args, **kwargs)[1]
+
+    decorator = condition(etag_func=etag, last_modified_func=last_modified)
+
+    def decorate(view):
+        view = decorator(view)
+        # По этим же областям страницу версионирует page_cache.
+        view.feed_scopes = get_scopes
+        return view
+    return decorate
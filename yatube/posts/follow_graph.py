@@ -0,0 +1,68 @@
+"""Граф подписок: на кого подписан пользователь.
+
+Множество авторов, на которых подписан пользователь, читается одним
+запросом, хранится в кэше и запоминается на объекте пользователя до
+конца запроса, поэтому ``is_following`` и ``follow_status`` для целой
+страницы постов не ходят в базу. Сигналы ``Follow`` сбрасывают кэш
+подписчика.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Follow
+from .utils import CursorPaginator
+
+FOLLOWING_KEY = 'follow-graph:{}'
+FOLLOW_ORDERING = ('-pk',)
+
+
+def get_following(user):
+    """Множество id авторов, на которых подписан ``user``."""
+    if not user.is_authenticated:
+        return frozenset()
+    following = getattr(user, '_following_ids', None)
+    if following is None:
+        key = FOLLOWING_KEY.format(user.pk)
+        following = cache.get(key)
+        if following is None:
+            following = frozenset(Follow.objects.filter(
+                user_id=user.pk).values_list('author_id', flat=True))
+            cache.set(key, following, None)
+        user._following_ids = following
+    return following
+
+
+def is_following(user, author):
+    return author.pk in get_following(user)
+
+
+def follow_status(user, authors):
+    """Словарь ``{id автора: подписан ли user}`` для авторов страницы."""
+    following = get_following(user)
+    return {author.pk: author.pk in following for author in authors}
+
+
+def forget(user_id):
+    """Сбрасывает подписки ``user_id`` после изменения ``Follow``.
+
+    Повторно — после коммита: иначе параллельный запрос успел бы
+    положить в кэш подписки из ещё не закоммиченного состояния.
+    """
+    key = FOLLOWING_KEY.format(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def followers(author):
+    """Пагинатор подписок на ``author``, новые первыми."""
+    return CursorPaginator(
+        Follow.objects.filter(author=author).select_related('user'),
+        settings.PAGE_LIMIT, FOLLOW_ORDERING)
+
+
+def following(user):
+    """Пагинатор подписок ``user``, новые первыми."""
+    return CursorPaginator(
+        Follow.objects.filter(user=user).select_related('author'),
+        settings.PAGE_LIMIT, FOLLOW_ORDERING)
@@ -1,7 +1,9 @@
 from django import forms
 from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import UploadedFile
 
-from .models import Comment, Post
+from . import images
+from .models import Comment, Group, Post
 
 User = get_user_model()
 
@@ -12,6 +14,12 @@ class PostForm(forms.ModelForm):
         self.fields['text'].widget.attrs['placeholder'] = 'Введите текст'
         self.fields['group'].empty_label = 'Выберите группу'
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            return images.normalize(image)
+        return image
+
     class Meta:
         model = Post
         fields = (
@@ -33,3 +41,23 @@ class CommentForm(forms.ModelForm):
     class Meta:
         model = Comment
         fields = ('text',)
+
+
+class SearchForm(forms.Form):
+    POSTS = 'posts'
+    COMMENTS = 'comments'
+
+    q = forms.CharField(label='Найти', max_length=200)
+    scope = forms.ChoiceField(
+        label='Где искать',
+        choices=((POSTS, 'В постах'), (COMMENTS, 'В комментариях')),
+        required=False,
+    )
+    group = forms.ModelChoiceField(
+        label='Группа',
+        queryset=Group.objects.all(),
+        to_field_name='slug',
+        empty_label='Все группы',
+        required=False,
+    )
+    author = forms.CharField(label='Автор', max_length=150, required=False)
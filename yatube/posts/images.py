@@ -0,0 +1,148 @@
+"""Нормализация картинок, загружаемых к постам.
+
+Загруженный файл проверяется по размеру в байтах и в пикселях до
+декодирования, поворачивается по EXIF, уменьшается до
+``POST_IMAGE_MAX_SIDE`` и перекодируется с ограничением качества; EXIF при
+этом не сохраняется. JPEG сразу декодируется в уменьшенном масштабе
+(``Image.draft``), поэтому полный растр большой фотографии в памяти не
+появляется.
+
+Рядом с картинками и миниатюрами кладётся копия в WebP с именем
+``<файл>.webp``, которую веб-сервер отдаёт браузерам с
+``Accept: image/webp``.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps, features
+
+# Форматы, в которых картинка остаётся; остальные переводятся в JPEG или PNG.
+KEPT_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (
+        image.mode == 'P' and 'transparency' in image.info)
+
+
+def _save_options(image, image_format):
+    options = {}
+    if image_format == 'JPEG':
+        options.update(
+            quality=settings.POST_IMAGE_QUALITY,
+            optimize=True,
+            progressive=True,
+        )
+    elif image_format == 'WEBP':
+        options.update(quality=settings.POST_IMAGE_WEBP_QUALITY, method=4)
+    elif image_format == 'PNG':
+        options.update(optimize=True)
+    for key in ('icc_profile', 'transparency'):
+        if key in image.info:
+            options[key] = image.info[key]
+    return options
+
+
+def _target_format(image, source_format):
+    if source_format in KEPT_FORMATS:
+        return source_format
+    return 'PNG' if _has_alpha(image) else 'JPEG'
+
+
+def _encode(image, image_format):
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, image_format, **_save_options(image, image_format))
+    return buffer.getvalue()
+
+
+def normalize(upload):
+    """Проверяет и перекодирует загруженную картинку.
+
+    Возвращает новый ``UploadedFile`` или исходный, если перекодирование
+    ничего не даёт; при нарушении ограничений и для испорченного файла —
+    ``ValidationError``.
+    """
+    max_bytes = settings.POST_IMAGE_MAX_BYTES
+    if upload.size > max_bytes:
+        raise ValidationError(
+            'Файл больше %(limit)d МБ.',
+            code='file_too_large',
+            params={'limit': max_bytes // (1024 * 1024)},
+        )
+    upload.seek(0)
+    try:
+        with Image.open(upload) as source:
+            width, height = source.size
+            if width * height > settings.POST_IMAGE_MAX_PIXELS:
+                raise ValidationError(
+                    'Картинка слишком большая: %(width)d×%(height)d.',
+                    code='image_too_large',
+                    params={'width': width, 'height': height},
+                )
+            if getattr(source, 'is_animated', False):
+                # Анимацию не перекодируем, чтобы не потерять кадры.
+                upload.seek(0)
+                return upload
+            source_format = source.format
+            had_exif = 'exif' in source.info
+            limit = settings.POST_IMAGE_MAX_SIDE
+            source.draft('RGB', (limit, limit))
+            image = ImageOps.exif_transpose(source)
+        # PNG иначе записал бы EXIF из info обратно в файл.
+        image.info.pop('exif', None)
+        image.thumbnail((limit, limit), Image.LANCZOS)
+        image_format = _target_format(image, source_format)
+        data = _encode(image, image_format)
+    except (OSError, Image.DecompressionBombError) as error:
+        # Обрезанный или испорченный файл ломается только при декодировании.
+        raise ValidationError(
+            'Файл повреждён или не является картинкой.',
+            code='invalid_image',
+        ) from error
+
+    changed = (
+        had_exif
+        or image.size != (width, height)
+        or image_format != source_format
+    )
+    if not changed and len(data) >= upload.size:
+        upload.seek(0)
+        return upload
+    stem = os.path.splitext(os.path.basename(upload.name))[0]
+    return SimpleUploadedFile(
+        f'{stem}.{EXTENSIONS[image_format]}',
+        data,
+        content_type=Image.MIME[image_format],
+    )
+
+
+def webp_name(name):
+    return f'{name}.webp'
+
+
+def save_webp(name, storage=default_storage):
+    """Сохраняет рядом с файлом его копию в WebP и возвращает её имя.
+
+    Ничего не делает, если Pillow собран без WebP, файл уже в WebP или
+    анимирован.
+    """
+    if not features.check('webp') or name.lower().endswith('.webp'):
+        return None
+    target = webp_name(name)
+    if storage.exists(target):
+        return target
+    with storage.open(name) as file, Image.open(file) as image:
+        if getattr(image, 'is_animated', False):
+            return None
+        image = image.convert('RGBA' if _has_alpha(image) else 'RGB')
+        data = _encode(image, 'WEBP')
+    storage.save(target, ContentFile(data))
+    return target
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import text_index
+
+
+class Command(BaseCommand):
+    help = 'Строит снимок поискового индекса постов для режима memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', default=settings.SEARCH_INDEX_PATH,
+            help='Куда записать снимок.',
+        )
+
+    def handle(self, *args, path, **options):
+        index = text_index.build()
+        index.save(path)
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано постов: {len(index)}, термов: '
+            f'{len(index.terms)}'))
@@ -0,0 +1,49 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import feed_cache, suggestions
+
+
+class Command(BaseCommand):
+    help = ('Считает рекомендации подписок по графу подписок и '
+            'комментариев на всех ядрах.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов; 0 — работать в текущем процессе.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Сколько пользователей отдавать процессу за раз.',
+        )
+        parser.add_argument(
+            '--limit', type=int, default=20,
+            help='Сколько рекомендаций хранить для пользователя.',
+        )
+
+    def handle(self, *args, workers, chunk_size, limit, **options):
+        graph = suggestions.Graph()
+        users = graph.users()
+        chunks = [users[start:start + chunk_size]
+                  for start in range(0, len(users), chunk_size)]
+        if workers:
+            # Дочерние процессы не должны делить соединения родителя.
+            connections.close_all()
+            with ProcessPoolExecutor(
+                    max_workers=workers,
+                    initializer=suggestions.init_worker,
+                    initargs=(graph,)) as pool:
+                count = suggestions.save(chunks, pool.map(
+                    suggestions.compute_chunk, chunks, repeat(limit)))
+        else:
+            suggestions.init_worker(graph)
+            count = suggestions.save(chunks, (
+                suggestions.compute_chunk(chunk, limit) for chunk in chunks))
+        feed_cache.bump(feed_cache.SUGGESTIONS)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пользователей: {len(users)}, рекомендаций: {count}'))
@@ -0,0 +1,46 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import thumbnails
+from posts.models import Post
+
+
+def init_worker():
+    # При запуске через spawn дочернему процессу нужен свой django.setup().
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = 'Создаёт недостающие миниатюры картинок постов на всех ядрах.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов; 0 — работать в текущем процессе.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=16,
+            help='Сколько картинок отдавать процессу за раз.',
+        )
+
+    def handle(self, *args, workers, chunk_size, **options):
+        names = list(
+            Post.objects.exclude(image='')
+            .order_by().values_list('image', flat=True).distinct()
+        )
+        if workers:
+            # Дочерние процессы не должны делить соединения родителя.
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers,
+                                     initializer=init_worker) as pool:
+                results = list(pool.map(
+                    thumbnails.generate_safely, names, chunksize=chunk_size))
+        else:
+            results = [thumbnails.generate_safely(name) for name in names]
+        failed = results.count(False)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {len(names)}, с ошибками: {failed}'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from posts import page_cache
+
+
+class Command(BaseCommand):
+    help = 'Показывает попадания в кэш страниц для анонимов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Обнулить счётчики после вывода.',
+        )
+
+    def handle(self, *args, reset=False, **options):
+        stats = page_cache.stats()
+        total = sum(stats.values())
+        served = stats['hit'] + stats['stale']
+        ratio = served / total * 100 if total else 0
+        self.stdout.write(
+            f'Попаданий: {stats["hit"]}, устаревших: {stats["stale"]}, '
+            f'промахов: {stats["miss"]}, из кэша: {ratio:.1f}%')
+        if reset:
+            page_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS('Счётчики обнулены'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает материализованные ленты подписок из Follow.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='id пользователя, чью ленту нужно перестроить '
+                 '(можно указать несколько раз).',
+        )
+
+    def handle(self, *args, user_ids=None, **options):
+        count = timeline.rebuild(user_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты перестроены, обработано подписок: {count}'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рейтинг постов в трендах по публикациям, '
+            'комментариям и накопленным просмотрам.')
+
+    def handle(self, *args, **options):
+        count = trending.rescore()
+        self.stdout.write(self.style.SUCCESS(
+            f'Рейтинг пересчитан, постов: {count}'))
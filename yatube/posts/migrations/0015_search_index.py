@@ -0,0 +1,79 @@
+from django.db import migrations
+
+# SQL переписан из posts.search на момент миграции: модуль приложения
+# может измениться, а миграция должна выполняться так же, как тогда.
+INDEXED = (
+    ('posts_post', 'posts_post_fts'),
+    ('posts_comment', 'posts_comment_fts'),
+)
+INDEXED_TEXT = "replace(replace({}, 'ё', 'е'), 'Ё', 'Е')"
+CREATE_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5("
+    "text, content='{table}', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS {index}_ai AFTER INSERT ON {table} BEGIN "
+    "INSERT INTO {index}(rowid, text) VALUES (new.id, {new_text}); END",
+    "CREATE TRIGGER IF NOT EXISTS {index}_ad AFTER DELETE ON {table} BEGIN "
+    "INSERT INTO {index}({index}, rowid, text) "
+    "VALUES ('delete', old.id, {old_text}); END",
+    "CREATE TRIGGER IF NOT EXISTS {index}_au AFTER UPDATE OF text "
+    "ON {table} BEGIN "
+    "INSERT INTO {index}({index}, rowid, text) "
+    "VALUES ('delete', old.id, {old_text}); "
+    "INSERT INTO {index}(rowid, text) VALUES (new.id, {new_text}); END",
+    "INSERT INTO {index}({index}) VALUES ('delete-all')",
+    "INSERT INTO {index}(rowid, text) SELECT id, {text} FROM {table}",
+)
+DROP_SQL = (
+    'DROP TRIGGER IF EXISTS {index}_ai',
+    'DROP TRIGGER IF EXISTS {index}_ad',
+    'DROP TRIGGER IF EXISTS {index}_au',
+    'DROP TABLE IF EXISTS {index}',
+)
+
+
+def _fts5_available(connection):
+    probe = connection.Database.connect(':memory:')
+    try:
+        probe.execute('CREATE VIRTUAL TABLE probe USING fts5(text)')
+    except connection.Database.OperationalError:
+        return False
+    finally:
+        probe.close()
+    return True
+
+
+def _execute(schema_editor, statements):
+    # FTS5 есть только в SQLite, и то не в каждой сборке; без него поиск
+    # идёт без индекса.
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite' or not _fts5_available(connection):
+        return
+    for table, index in INDEXED:
+        for statement in statements:
+            schema_editor.execute(statement.format(
+                table=table,
+                index=index,
+                text=INDEXED_TEXT.format('text'),
+                new_text=INDEXED_TEXT.format('new.text'),
+                old_text=INDEXED_TEXT.format('old.text'),
+            ), params=None)
+
+
+def create_index(apps, schema_editor):
+    _execute(schema_editor, CREATE_SQL)
+
+
+def remove_index(apps, schema_editor):
+    _execute(schema_editor, DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, remove_index),
+    ]
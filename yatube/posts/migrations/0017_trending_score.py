@@ -0,0 +1,75 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:00
+
+import math
+from datetime import datetime
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+# Формулы и веса из posts.trending на момент миграции. Период
+# полураспада берётся из настроек: с ним же рейтинг потом и растёт.
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+PUBLISH_WEIGHT = 10
+COMMENT_WEIGHT = 5
+BATCH_SIZE = 500
+
+
+def event_score(weight, moment):
+    tau = settings.TRENDING_HALF_LIFE / math.log(2)
+    return math.log(weight) + (moment - EPOCH).total_seconds() / tau
+
+
+def logaddexp(a, b):
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def fill_scores(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    comments = {}
+    for post_id, created in Comment.objects.order_by().values_list(
+            'post_id', 'created').iterator():
+        score = event_score(COMMENT_WEIGHT, created)
+        current = comments.get(post_id)
+        comments[post_id] = (
+            score if current is None else logaddexp(current, score))
+    last_pk = 0
+    while True:
+        batch = list(Post.objects.filter(pk__gt=last_pk).order_by(
+            'pk').only('pk', 'pub_date')[:BATCH_SIZE])
+        if not batch:
+            return
+        for post in batch:
+            score = event_score(PUBLISH_WEIGHT, post.pub_date)
+            if post.pk in comments:
+                score = logaddexp(score, comments[post.pk])
+            post.trending_score = score
+        Post.objects.bulk_update(batch, ['trending_score'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_follow_suggestions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Рейтинг в трендах'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='trending_views',
+            field=models.FloatField(default=0, editable=False, verbose_name='Рейтинг просмотров'),
+        ),
+        migrations.RunPython(fill_scores, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-trending_score', '-id'], name='post_trending_idx'),
+        ),
+    ]
@@ -0,0 +1,198 @@
+"""Кэш целых страниц для анонимных пользователей.
+
+Страницы из ``PAGE_CACHE_ROUTES`` (имя маршрута → время жизни в секундах)
+анонимы получают из кэша без обращения к ORM и шаблонам. Запись хранит
+версии областей лент, из которых собрана страница (``feed_scopes``
+представления, см. ``feed_cache.conditional_feed``), поэтому изменение
+поста сразу делает её устаревшей.
+
+Устаревшую страницу перестраивает только один запрос: он берёт
+блокировку через ``cache.add``, а остальные до конца перестройки
+получают старую копию. Запись живёт в кэше дольше своего срока на
+``PAGE_CACHE_STALE``, чтобы такая копия была.
+
+Перестраивающий страницу запрос читает основную базу, даже если маршрут
+идёт на реплику: под новой версией нельзя сохранять устаревшие данные.
+
+Не кэшируются ответы, которые ставят cookie или используют CSRF-токен,
+и запросы с непоказанными сообщениями. Счётчики попаданий показывает
+команда ``page_cache_stats``. Процесс копит их у себя и переносит в кэш
+пачкой: ключи ``page-cache:`` идут мимо локального уровня общего кэша, и
+запись на каждый просмотр была бы транзакцией в нём. Поэтому команда
+видит чужие попадания с опозданием до ``STATS_FLUSH_INTERVAL`` секунд.
+"""
+import threading
+import time
+from collections import Counter
+from hashlib import md5
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from . import feed_cache
+from core import replicas
+
+PAGE_KEY = 'page:{}'
+LOCK_KEY = 'page-lock:{}'
+STATS_KEY = 'page-cache:{}'
+OUTCOMES = ('hit', 'stale', 'miss')
+# Столько секунд перестройка страницы держит блокировку.
+LOCK_TIMEOUT = 10
+# Счётчики уходят в кэш после стольких запросов или секунд.
+STATS_FLUSH_EVERY = 100
+STATS_FLUSH_INTERVAL = 10
+
+_counts = Counter()
+_counts_lock = threading.Lock()
+# Когда посчитан первый ещё не перенесённый в кэш запрос.
+_counted_since = None
+
+
+def count(outcome):
+    global _counted_since
+    with _counts_lock:
+        _counts[outcome] += 1
+        if _counted_since is None:
+            _counted_since = time.monotonic()
+        due = (
+            sum(_counts.values()) >= STATS_FLUSH_EVERY
+            or time.monotonic() - _counted_since >= STATS_FLUSH_INTERVAL
+        )
+    if due:
+        flush_stats()
+
+
+def _take_counts():
+    global _counted_since
+    with _counts_lock:
+        counts = dict(_counts)
+        _counts.clear()
+        _counted_since = None
+    return counts
+
+
+def flush_stats():
+    """Переносит в кэш счётчики, накопленные этим процессом."""
+    for outcome, number in _take_counts().items():
+        key = STATS_KEY.format(outcome)
+        if not cache.add(key, number, None):
+            try:
+                cache.incr(key, number)
+            except ValueError:
+                cache.set(key, number, None)
+
+
+def stats():
+    """Счётчики ``hit``, ``stale`` и ``miss``."""
+    flush_stats()
+    values = cache.get_many([STATS_KEY.format(name) for name in OUTCOMES])
+    return {name: values.get(STATS_KEY.format(name), 0) for name in OUTCOMES}
+
+
+def reset_stats():
+    _take_counts()
+    cache.delete_many([STATS_KEY.format(name) for name in OUTCOMES])
+
+
+def _page_key(request):
+    return md5(request.build_absolute_uri().encode()).hexdigest()
+
+
+def _anonymous_request(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if CookieStorage.cookie_name in request.COOKIES:
+        return False
+    return not request.user.is_authenticated
+
+
+def _cacheable_response(request, response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_USED')
+        and not len(get_messages(request))
+    )
+
+
+def _revalidate(request, response):
+    """Отвечает 304 на условный запрос к закэшированной странице."""
+    last_modified = response.get('Last-Modified')
+    return get_conditional_response(
+        request,
+        etag=response.get('ETag'),
+        last_modified=last_modified and parse_http_date_safe(last_modified),
+        response=response,
+    )
+
+
+class AnonymousPageCacheMiddleware:
+    """Отдаёт анонимам страницы из кэша и сохраняет их туда.
+
+    Ставится после ``AuthenticationMiddleware`` и
+    ``MessageMiddleware``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        state = getattr(request, '_page_cache', None)
+        if state is None:
+            return response
+        if _cacheable_response(request, response):
+            if callable(getattr(response, 'render', None)) and (
+                    not response.is_rendered):
+                response.add_post_render_callback(
+                    lambda rendered: self.store(state, rendered))
+            else:
+                self.store(state, response)
+        else:
+            cache.delete(LOCK_KEY.format(state['key']))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timeout = settings.PAGE_CACHE_ROUTES.get(
+            request.resolver_match.view_name)
+        if timeout is None or not _anonymous_request(request):
+            return None
+        scopes = []
+        get_scopes = getattr(view_func, 'feed_scopes', None)
+        if get_scopes is not None:
+            scopes = get_scopes(request, *view_args, **view_kwargs)
+            if scopes is None:
+                return None
+        versions = feed_cache.get_state(scopes)[0] if scopes else []
+        key = _page_key(request)
+        entry = cache.get(PAGE_KEY.format(key))
+        if entry is not None and (entry['versions'] == versions
+                                  and entry['expires'] > time.time()):
+            count('hit')
+            return _revalidate(request, entry['response'])
+        if cache.add(LOCK_KEY.format(key), 1, LOCK_TIMEOUT):
+            count('miss')
+            replicas.use_primary()
+            request._page_cache = {
+                'key': key, 'versions': versions, 'timeout': timeout}
+            return None
+        if entry is not None:
+            count('stale')
+            return _revalidate(request, entry['response'])
+        # Первую копию ещё строит другой запрос: рисуем без сохранения.
+        count('miss')
+        return None
+
+    def store(self, state, response):
+        key = state['key']
+        cache.set(PAGE_KEY.format(key), {
+            'versions': state['versions'],
+            'expires': time.time() + state['timeout'],
+            'response': response,
+        }, state['timeout'] + settings.PAGE_CACHE_STALE)
+        cache.delete(LOCK_KEY.format(key))
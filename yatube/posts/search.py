@@ -0,0 +1,231 @@
+"""Полнотекстовый поиск по постам и комментариям.
+
+На SQLite тексты лежат в таблицах FTS5 ``posts_post_fts`` и
+``posts_comment_fts`` с внешним содержимым: в индексе хранятся только
+токены, а сам текст читается из ``posts_post`` и ``posts_comment``.
+Индексы обновляют триггеры на этих таблицах, поэтому в поиск попадают
+и изменения через ``bulk_create`` или ``QuerySet.update``. Триггеры
+заново ставятся после каждого ``migrate``: SQLite-бэкенд Django
+пересоздаёт таблицу при изменении схемы, и триггеры пропадают вместе со
+старой таблицей.
+
+Токенизатор ``unicode61`` не приравнивает «ё» к «е», поэтому в индекс
+попадает текст с заменой «ё» на «е», и так же меняется запрос. Удаление
+из индекса с внешним содержимым должно получить те же значения, что и
+вставка, — триггеры считают их одним выражением.
+
+Результаты упорядочены по bm25. На СУБД без FTS5 посты ищутся по
+индексу в памяти процесса (``text_index``), а комментарии — через
+``icontains`` по словам запроса. Так же ищется и на SQLite, собранном
+без FTS5. Выбор задаёт ``SEARCH_BACKEND``.
+"""
+import functools
+import re
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from . import text_index
+from .models import Comment, Post
+from .utils import (COMMENTS_ORDERING, FEED_ORDERING, CursorPaginator,
+                    RankedPaginator)
+
+User = get_user_model()
+
+RANK_ORDERING = ('search_rank', 'pk')
+# Больше слов поиску не помогает, а каждое стоит прохода по индексу.
+MAX_WORDS = 8
+WORD = re.compile(r'\w+')
+
+INDEXED = (
+    (Post._meta.db_table, 'posts_post_fts'),
+    (Comment._meta.db_table, 'posts_comment_fts'),
+)
+
+# Текст, который попадает в индекс.
+INDEXED_TEXT = "replace(replace({}, 'ё', 'е'), 'Ё', 'Е')"
+
+INDEX_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5("
+    "text, content='{table}', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+)
+TRIGGERS_DDL = (
+    "CREATE TRIGGER IF NOT EXISTS {index}_ai AFTER INSERT ON {table} BEGIN "
+    "INSERT INTO {index}(rowid, text) VALUES (new.id, {new_text}); END",
+    "CREATE TRIGGER IF NOT EXISTS {index}_ad AFTER DELETE ON {table} BEGIN "
+    "INSERT INTO {index}({index}, rowid, text) "
+    "VALUES ('delete', old.id, {old_text}); END",
+    "CREATE TRIGGER IF NOT EXISTS {index}_au AFTER UPDATE OF text "
+    "ON {table} BEGIN "
+    "INSERT INTO {index}({index}, rowid, text) "
+    "VALUES ('delete', old.id, {old_text}); "
+    "INSERT INTO {index}(rowid, text) VALUES (new.id, {new_text}); END",
+)
+REBUILD_DDL = (
+    "INSERT INTO {index}({index}) VALUES ('delete-all')",
+    "INSERT INTO {index}(rowid, text) SELECT id, {text} FROM {table}",
+)
+DROP_DDL = (
+    'DROP TRIGGER IF EXISTS {index}_ai',
+    'DROP TRIGGER IF EXISTS {index}_ad',
+    'DROP TRIGGER IF EXISTS {index}_au',
+    'DROP TABLE IF EXISTS {index}',
+)
+
+
+def fts_available(using=connection):
+    return using.vendor == 'sqlite' and _sqlite_has_fts5(using.Database)
+
+
+@functools.lru_cache(maxsize=None)
+def _sqlite_has_fts5(database):
+    """Есть ли FTS5 в библиотеке SQLite: некоторые сборки идут без него.
+
+    Проверка идёт на отдельной базе в памяти, чтобы не трогать соединение
+    Django и не открывать в нём транзакцию.
+    """
+    probe = database.connect(':memory:')
+    try:
+        probe.execute('CREATE VIRTUAL TABLE probe USING fts5(text)')
+    except database.OperationalError:
+        return False
+    finally:
+        probe.close()
+    return True
+
+
+def backend():
+    """'fts', 'memory' или 'like' — чем искать при текущих настройках."""
+    if settings.SEARCH_BACKEND == 'auto':
+        return 'fts' if fts_available() else 'memory'
+    return settings.SEARCH_BACKEND
+
+
+def post_changed(post_id):
+    if backend() == 'memory':
+        text_index.record(post_id)
+
+
+def _execute(using, statements):
+    with using.cursor() as cursor:
+        for table, index in INDEXED:
+            for statement in statements:
+                cursor.execute(statement.format(
+                    table=table,
+                    index=index,
+                    text=INDEXED_TEXT.format('text'),
+                    new_text=INDEXED_TEXT.format('new.text'),
+                    old_text=INDEXED_TEXT.format('old.text'),
+                ))
+
+
+def install_index(using, rebuild=False):
+    """Создаёт индексы и триггеры; ``rebuild`` переиндексирует тексты."""
+    if not fts_available(using):
+        return
+    _execute(using, INDEX_DDL + TRIGGERS_DDL)
+    if rebuild:
+        _execute(using, REBUILD_DDL)
+
+
+def install_triggers(using):
+    if fts_available(using) and _index_exists(using):
+        _execute(using, TRIGGERS_DDL)
+
+
+def drop_index(using):
+    if fts_available(using):
+        _execute(using, DROP_DDL)
+
+
+def _index_exists(using):
+    with using.cursor() as cursor:
+        return INDEXED[0][1] in using.introspection.table_names(cursor)
+
+
+def parse_query(text):
+    """Запрос FTS5 из слов пользователя: все слова, каждое как префикс."""
+    words = WORD.findall(text.lower().replace('ё', 'е'))[:MAX_WORDS]
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def _index_for(queryset):
+    return dict(INDEXED)[queryset.model._meta.db_table]
+
+
+def match(queryset, text):
+    """Оставляет записи, текст которых подходит под запрос."""
+    kind = backend()
+    if kind == 'fts':
+        query = parse_query(text)
+        if not query:
+            return queryset.none()
+        table = queryset.model._meta.db_table
+        index = _index_for(queryset)
+        return queryset.extra(
+            tables=[index],
+            where=[f'"{index}"."rowid" = "{table}"."id"',
+                   f'"{index}" MATCH %s'],
+            params=[query],
+        )
+    if kind == 'memory' and queryset.model is Post:
+        ranking = text_index.get_index().search(text)
+        return queryset.filter(pk__in=[pk for _, pk in ranking])
+    words = WORD.findall(text)[:MAX_WORDS]
+    if not words:
+        return queryset.none()
+    condition = Q()
+    for word in words:
+        condition &= Q(text__icontains=word)
+    return queryset.filter(condition)
+
+
+def ranked(queryset, text, fallback_ordering):
+    """Результаты поиска и сортировка для ``CursorPaginator``."""
+    results = match(queryset, text)
+    if backend() != 'fts':
+        return results, fallback_ordering
+    index = _index_for(queryset)
+    return results.annotate(search_rank=RawSQL(
+        f'bm25("{index}")', (), output_field=FloatField())), RANK_ORDERING
+
+
+def _search_in_memory(posts, text, group, author):
+    author_id = None
+    if author:
+        author_id = User.objects.filter(
+            username=author).values_list('pk', flat=True).first()
+        if author_id is None:
+            return RankedPaginator(posts, [], settings.PAGE_LIMIT)
+    ranking = text_index.get_index().search(
+        text, author_id=author_id,
+        group_id=group.pk if group is not None else None)
+    return RankedPaginator(posts, ranking, settings.PAGE_LIMIT)
+
+
+def search_posts(text, group=None, author=None):
+    """Пагинатор найденных постов, лучшие совпадения первыми."""
+    posts = Post.objects.select_related('author', 'group')
+    if backend() == 'memory':
+        return _search_in_memory(posts, text, group, author)
+    if group is not None:
+        posts = posts.filter(group=group)
+    if author:
+        posts = posts.filter(author__username=author)
+    results, ordering = ranked(posts, text, FEED_ORDERING)
+    return CursorPaginator(results, settings.PAGE_LIMIT, ordering)
+
+
+def search_comments(text, group=None, author=None):
+    """Пагинатор найденных комментариев."""
+    comments = Comment.objects.select_related('author', 'post')
+    if group is not None:
+        comments = comments.filter(post__group=group)
+    if author:
+        comments = comments.filter(author__username=author)
+    results, ordering = ranked(comments, text, COMMENTS_ORDERING)
+    return CursorPaginator(results, settings.PAGE_LIMIT, ordering)
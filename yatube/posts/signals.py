@@ -0,0 +1,114 @@
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import DEFERRED
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import (counters, feed_cache, follow_graph, search, timeline,
+               trending)
+from .models import Comment, Follow, Group, Post, UserCounter
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserCounter.objects.get_or_create(user=instance)
+
+
+@receiver(post_init, sender=Post)
+def post_loaded(sender, instance, **kwargs):
+    # Для .only()/.defer() без group_id не догружаем поле лишним запросом.
+    instance._saved_group_id = instance.__dict__.get('group_id', DEFERRED)
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, raw=False, **kwargs):
+    # Рейтинг новой публикации ставится тем же INSERT, без UPDATE после;
+    # pub_date (auto_now_add) ещё не заполнена, но будет равна «сейчас».
+    if instance._state.adding and not raw and not instance.trending_score:
+        instance.trending_score = trending.initial_score()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.shift_user(instance.author_id, posts_count=1)
+        counters.shift_group(instance.group_id, 1)
+        timeline.fan_out(instance)
+    elif instance._saved_group_id not in (DEFERRED, instance.group_id):
+        counters.shift_group(instance._saved_group_id, -1)
+        counters.shift_group(instance.group_id, 1)
+    feed_cache.bump(*feed_cache.post_scopes(
+        instance.author_id, instance.group_id, instance._saved_group_id))
+    search.post_changed(instance.pk)
+    instance._saved_group_id = instance.group_id
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.shift_user(instance.author_id, posts_count=-1)
+    counters.shift_group(instance._saved_group_id, -1)
+    feed_cache.bump(*feed_cache.post_scopes(
+        instance.author_id, instance._saved_group_id))
+    search.post_changed(instance.pk)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        feed_cache.bump(
+            feed_cache.INDEX, feed_cache.group_scope(instance.slug))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.shift_post(instance.post_id, 1)
+        trending.record_comment(instance)
+    bump_comment_feeds(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.shift_post(instance.post_id, -1)
+    bump_comment_feeds(instance)
+
+
+def bump_comment_feeds(comment):
+    # Число комментариев показывает только страница поста, не ленты.
+    feed_cache.bump(feed_cache.post_scope(comment.post_id))
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.shift_user(instance.user_id, following_count=1)
+        counters.shift_user(instance.author_id, followers_count=1)
+        timeline.backfill(instance.user_id, instance.author_id)
+        follow_graph.forget(instance.user_id)
+        feed_cache.bump(*feed_cache.follow_scopes(
+            instance.user_id, instance.author_id))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.shift_user(instance.user_id, following_count=-1)
+    counters.shift_user(instance.author_id, followers_count=-1)
+    timeline.prune(instance.user_id, instance.author_id)
+    follow_graph.forget(instance.user_id)
+    feed_cache.bump(*feed_cache.follow_scopes(
+        instance.user_id, instance.author_id))
+
+
+def restore_search_triggers(sender, using, **kwargs):
+    # Подключается в PostsConfig.ready(): после пересоздания таблиц
+    # миграциями триггеры поискового индекса нужно поставить снова.
+    search.install_triggers(connections[using])
@@ -0,0 +1,107 @@
+"""Стеммер русского языка по алгоритму Snowball (Портер).
+
+Отрезает окончания, чтобы разные формы слова («ёжик», «ёжики», «ёжика»)
+попадали в поисковый индекс одним термом. Слова на других языках
+возвращаются без изменений, кроме замены «ё» на «е».
+"""
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (('в', 'вши', 'вшись'),
+                     ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'))
+REFLEXIVE = ((), ('ся', 'сь'))
+ADJECTIVE = ((), ('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый',
+                  'ой', 'ем', 'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому',
+                  'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею'))
+PARTICIPLE = (('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+VERB = (('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но',
+         'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'),
+        ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей',
+         'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят',
+         'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'))
+NOUN = ((), ('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи',
+             'ии', 'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием',
+             'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию',
+             'ью', 'ю', 'ия', 'ья', 'я'))
+SUPERLATIVE = ((), ('ейш', 'ейше'))
+DERIVATIONAL = ((), ('ост', 'ость'))
+
+
+def _regions(word):
+    """Начала областей RV и R2 по правилам Snowball."""
+    rv = r1 = r2 = len(word)
+    for index, letter in enumerate(word):
+        if letter in VOWELS:
+            rv = index + 1
+            break
+    for index in range(1, len(word)):
+        if word[index] not in VOWELS and word[index - 1] in VOWELS:
+            r1 = index + 1
+            break
+    for index in range(r1 + 1, len(word)):
+        if word[index] not in VOWELS and word[index - 1] in VOWELS:
+            r2 = index + 1
+            break
+    return rv, r2
+
+
+def _strip(word, start, endings):
+    """Отрезает самое длинное окончание из ``endings`` внутри области.
+
+    Окончания первой группы отрезаются только после «а» или «я».
+    Возвращает слово без окончания или ``None``.
+    """
+    after_a, plain = endings
+    best = None
+    for ending in after_a + plain:
+        if (word.endswith(ending) and len(word) - len(ending) >= start
+                and (best is None or len(ending) > len(best))):
+            best = ending
+    if best is None:
+        return None
+    stem = word[:-len(best)]
+    if best in plain:
+        return stem
+    if len(stem) > start and stem[-1] in 'ая':
+        return stem
+    return None
+
+
+def _remove_ending(word, rv):
+    """Шаг 1: окончание деепричастия, прилагательного, глагола, имени."""
+    stripped = _strip(word, rv, PERFECTIVE_GERUND)
+    if stripped is not None:
+        return stripped
+    word = _strip(word, rv, REFLEXIVE) or word
+    stripped = _strip(word, rv, ADJECTIVE)
+    if stripped is not None:
+        return _strip(stripped, rv, PARTICIPLE) or stripped
+    stripped = _strip(word, rv, VERB)
+    if stripped is not None:
+        return stripped
+    return _strip(word, rv, NOUN) or word
+
+
+def _tidy(word, rv):
+    """Шаг 4: «нн» → «н», превосходная степень, мягкий знак."""
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        return word[:-1]
+    stripped = _strip(word, rv, SUPERLATIVE)
+    if stripped is not None:
+        if stripped.endswith('нн') and len(stripped) - 2 >= rv:
+            return stripped[:-1]
+        return stripped
+    if word.endswith('ь') and len(word) - 1 >= rv:
+        return word[:-1]
+    return word
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = _regions(word)
+    if rv >= len(word):
+        return word
+    word = _remove_ending(word, rv)
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+    word = _strip(word, r2, DERIVATIONAL) or word
+    return _tidy(word, rv)
@@ -0,0 +1,173 @@
+"""Рекомендации «на кого подписаться».
+
+Считаются пакетно командой ``compute_suggestions``, а ``follow_index``
+читает готовые строки ``FollowSuggestion`` одним запросом по индексу.
+
+Граф подписок и комментариев загружается в память в виде смежности CSR
+(два массива ``array``: смещения и соседи), поэтому миллионы рёбер
+занимают десятки мегабайт и без копирования наследуются процессами,
+запущенными через fork. Кандидаты для пользователя:
+
+* авторы, на которых подписаны его авторы (друзья друзей), — вес 1;
+* те, кто комментирует те же посты, — вес ``COMMENT_WEIGHT``.
+
+Из кандидатов убираются сам пользователь, те, на кого он уже подписан,
+и пользователи без постов.
+"""
+import heapq
+from array import array
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from . import follow_graph
+from .models import Comment, Follow, FollowSuggestion, Post
+
+User = get_user_model()
+
+COMMENT_WEIGHT = 0.5
+# Сколько соседей одной вершины учитывается: популярные авторы и
+# обсуждаемые посты иначе дали бы миллионы кандидатов.
+MAX_FANOUT = 1000
+# Сколько рекомендаций показывается в ленте подписок.
+SHOWN = 5
+BATCH_SIZE = 500
+
+_graph = None
+
+
+class Adjacency:
+    """Смежность CSR: соседи вершины ``v`` — ``targets[offsets[v]:...]``."""
+
+    def __init__(self, pairs, size):
+        """``pairs`` — пары (вершина, сосед), отсортированные по вершине.
+
+        ``size`` — наибольшая ожидаемая вершина; пары с вершинами больше
+        неё (пользователь появился после подсчёта) тоже попадают в граф.
+        """
+        self.offsets = array('q', [0])
+        self.targets = array('q')
+        for source, target in pairs:
+            while len(self.offsets) <= source:
+                self.offsets.append(len(self.targets))
+            self.targets.append(target)
+        end = max(size + 2, len(self.offsets) + 1)
+        self.offsets.extend(
+            array('q', [len(self.targets)]) * (end - len(self.offsets)))
+
+    def neighbours(self, vertex, limit=None):
+        if vertex + 1 >= len(self.offsets):
+            return self.targets[:0]
+        start = self.offsets[vertex]
+        end = self.offsets[vertex + 1]
+        if limit is not None:
+            end = min(end, start + limit)
+        return self.targets[start:end]
+
+
+class Graph:
+    @transaction.atomic
+    def __init__(self):
+        # Одна транзакция — один снимок базы для всех таблиц графа.
+        size = _max_id()
+        self.follows = Adjacency(
+            Follow.objects.order_by('user_id', 'author_id').values_list(
+                'user_id', 'author_id').iterator(), size)
+        self.commented = Adjacency(
+            Comment.objects.order_by('author_id', '-post_id').values_list(
+                'author_id', 'post_id').distinct().iterator(), size)
+        self.commenters = Adjacency(
+            Comment.objects.order_by('post_id', 'author_id').values_list(
+                'post_id', 'author_id').distinct().iterator(),
+            Post.objects.order_by('-pk').values_list(
+                'pk', flat=True).first() or 0)
+        self.authors = frozenset(Post.objects.order_by().values_list(
+            'author_id', flat=True).distinct())
+
+    def users(self):
+        """Пользователи, для которых есть из чего считать, по возрастанию."""
+        followers = Follow.objects.values_list('user_id', flat=True)
+        commenters = Comment.objects.values_list('author_id', flat=True)
+        return sorted(set(followers.distinct()) | set(commenters.distinct()))
+
+
+def _max_id():
+    return User.objects.order_by('-pk').values_list(
+        'pk', flat=True).first() or 0
+
+
+def suggest(graph, user_id, limit):
+    """До ``limit`` пар (вес, id автора) для пользователя, лучшие первыми."""
+    counts = Counter()
+    followed = graph.follows.neighbours(user_id)
+    for author_id in followed[:MAX_FANOUT]:
+        # Counter.update по срезу массива считает в C.
+        counts.update(graph.follows.neighbours(author_id, MAX_FANOUT))
+    comment_counts = Counter()
+    for post_id in graph.commented.neighbours(user_id, MAX_FANOUT):
+        comment_counts.update(graph.commenters.neighbours(post_id, MAX_FANOUT))
+    for commenter_id, count in comment_counts.items():
+        counts[commenter_id] += count * COMMENT_WEIGHT
+    excluded = set(followed)
+    excluded.add(user_id)
+    # При равном весе первыми идут авторы с меньшим id.
+    return heapq.nlargest(limit, (
+        (score, author_id) for author_id, score in counts.items()
+        if author_id not in excluded and author_id in graph.authors
+    ), key=lambda row: (row[0], -row[1]))
+
+
+def init_worker(graph):
+    global _graph
+    _graph = graph
+
+
+def compute_chunk(user_ids, limit):
+    """Рекомендации для пачки пользователей: строки (user, author, вес)."""
+    return [
+        (user_id, author_id, score)
+        for user_id in user_ids
+        for score, author_id in suggest(_graph, user_id, limit)
+    ]
+
+
+@transaction.atomic
+def _replace(low, high, rows):
+    stale = FollowSuggestion.objects.filter(user_id__gte=low)
+    if high is not None:
+        stale = stale.filter(user_id__lte=high)
+    stale.delete()
+    FollowSuggestion.objects.bulk_create(
+        (FollowSuggestion(user_id=user_id, author_id=author_id, score=score)
+         for user_id, author_id, score in rows),
+        batch_size=BATCH_SIZE,
+    )
+
+
+def save(chunks, results):
+    """Заменяет рекомендации пачка за пачкой; возвращает число строк.
+
+    Пачка заменяет весь диапазон id от предыдущей пачки до своего
+    последнего пользователя, поэтому исчезают и рекомендации тех, у кого
+    больше нет ни подписок, ни комментариев.
+    """
+    low = count = 0
+    for number, (chunk, rows) in enumerate(zip(chunks, results), 1):
+        high = chunk[-1] if number < len(chunks) else None
+        _replace(low, high, rows)
+        low = chunk[-1] + 1
+        count += len(rows)
+    if not chunks:
+        _replace(0, None, ())
+    return count
+
+
+def for_user(user):
+    """Рекомендации для ленты подписок, без уже оформленных подписок."""
+    rows = FollowSuggestion.objects.filter(user=user)
+    following = follow_graph.get_following(user)
+    if following:
+        rows = rows.exclude(author_id__in=following)
+    return rows.select_related('author').order_by(
+        '-score', 'author_id')[:SHOWN]
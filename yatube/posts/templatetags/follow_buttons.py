@@ -0,0 +1,15 @@
+from django import template
+
+from .. import follow_graph
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def prefetch_follow_status(context, posts):
+    """Отмечает у постов страницы, подписан ли зритель на их авторов."""
+    status = follow_graph.follow_status(
+        context['user'], [post.author for post in posts])
+    for post in posts:
+        post.author_followed = status[post.author_id]
+    return ''
@@ -0,0 +1,12 @@
+from django import template
+
+from .. import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def prefetch_thumbnails(posts):
+    """Загружает миниатюры всех постов страницы до вывода карточек."""
+    thumbnails.prefetch(posts)
+    return ''
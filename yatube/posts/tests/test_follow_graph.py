@@ -0,0 +1,132 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import follow_graph
+from ..models import Follow, Post
+
+User = get_user_model()
+
+
+class FollowGraphTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author{number}')
+            for number in range(3)
+        ]
+        Follow.objects.create(user=cls.reader, author=cls.authors[0])
+        Follow.objects.create(user=cls.reader, author=cls.authors[1])
+        for author in cls.authors:
+            Post.objects.create(author=author, text=f'Пост {author}')
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def reader_from_db(self):
+        return User.objects.get(pk=self.reader.pk)
+
+    def test_following_loaded_once(self):
+        reader = self.reader_from_db()
+        with self.assertNumQueries(1):
+            self.assertTrue(follow_graph.is_following(reader, self.authors[0]))
+            self.assertFalse(
+                follow_graph.is_following(reader, self.authors[2]))
+        reader = self.reader_from_db()
+        with self.assertNumQueries(0):
+            follow_graph.is_following(reader, self.authors[1])
+
+    def test_follow_status_for_page(self):
+        self.assertEqual(
+            follow_graph.follow_status(self.reader_from_db(), self.authors),
+            {self.authors[0].pk: True, self.authors[1].pk: True,
+             self.authors[2].pk: False})
+
+    def test_follow_changes_are_picked_up(self):
+        follow_graph.get_following(self.reader_from_db())
+        self.reader_client.get(
+            reverse('posts:profile_follow', args=(self.authors[2].username,)))
+        self.assertTrue(follow_graph.is_following(
+            self.reader_from_db(), self.authors[2]))
+        self.reader_client.get(reverse(
+            'posts:profile_unfollow', args=(self.authors[0].username,)))
+        self.assertFalse(follow_graph.is_following(
+            self.reader_from_db(), self.authors[0]))
+
+    def test_index_shows_follow_buttons(self):
+        response = self.reader_client.get(reverse('posts:index'))
+        for author, action in zip(self.authors, (
+                'profile_unfollow', 'profile_unfollow', 'profile_follow')):
+            with self.subTest(author=author.username):
+                self.assertContains(
+                    response,
+                    reverse(f'posts:{action}', args=(author.username,)))
+
+    def test_index_buttons_follow_subscriptions(self):
+        url = reverse('posts:index')
+        self.reader_client.get(url)
+        self.reader_client.get(
+            reverse('posts:profile_follow', args=(self.authors[2].username,)))
+        self.assertContains(
+            self.reader_client.get(url),
+            reverse('posts:profile_unfollow',
+                    args=(self.authors[2].username,)))
+
+    def test_guest_sees_no_follow_buttons(self):
+        response = Client().get(reverse('posts:index'))
+        self.assertNotContains(
+            response,
+            reverse('posts:profile_follow', args=(self.authors[2].username,)))
+
+    def test_follow_lists(self):
+        page = follow_graph.following(self.reader).get_page()
+        self.assertEqual(
+            [follow.author for follow in page],
+            [self.authors[1], self.authors[0]])
+        page = follow_graph.followers(self.authors[0]).get_page()
+        self.assertEqual([follow.user for follow in page], [self.reader])
+
+
+class FollowListTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.followers = [
+            User.objects.create_user(username=f'follower{number}')
+            for number in range(settings.PAGE_LIMIT + 3)
+        ]
+        for follower in cls.followers:
+            Follow.objects.create(user=follower, author=cls.author)
+
+    def test_followers_are_paginated_by_cursor(self):
+        url = reverse('posts:profile_followers', args=(self.author.username,))
+        response = self.client.get(url)
+        first = [follow.user for follow in response.context['page_obj']]
+        self.assertEqual(first, self.followers[::-1][:settings.PAGE_LIMIT])
+        self.assertContains(
+            response, f'Подписчики: {len(self.followers)}')
+        response = self.client.get(
+            url, {'cursor': response.context['page_obj'].next_cursor})
+        rest = [follow.user for follow in response.context['page_obj']]
+        self.assertEqual(rest, self.followers[::-1][settings.PAGE_LIMIT:])
+
+    def test_following_list(self):
+        follower = self.followers[0]
+        response = self.client.get(
+            reverse('posts:profile_following', args=(follower.username,)))
+        self.assertEqual(
+            [follow.author for follow in response.context['page_obj']],
+            [self.author])
+        self.assertContains(response, 'Подписки: 1')
+
+    def test_missing_user(self):
+        response = self.client.get(
+            reverse('posts:profile_followers', args=('nobody',)))
+        self.assertEqual(response.status_code, 404)
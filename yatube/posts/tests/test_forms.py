@@ -1,7 +1,16 @@
+import shutil
+import tempfile
 from http import HTTPStatus
+from io import BytesIO
+from unittest import skipUnless
 
-from django.test import Client, TestCase
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image, features
+from posts import images
 from posts.forms import PostForm
 from posts.models import Comment, Group, Post, User
 
@@ -116,3 +125,76 @@ class PostCreateFormTests(TestCase):
             follow=True
         )
         self.assertEqual(Comment.objects.count(), comments_count + 1)
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+# Тег EXIF с ориентацией: 6 — повернуть на 90° по часовой стрелке.
+EXIF_ORIENTATION = 0x0112
+
+
+def make_image(name, image_format, size=(400, 200), orientation=None):
+    image = Image.new('RGB', size, (200, 30, 30))
+    options = {}
+    if orientation:
+        exif = Image.Exif()
+        exif[EXIF_ORIENTATION] = orientation
+        options['exif'] = exif.tobytes()
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PostImageUploadTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def clean(self, upload):
+        form = PostForm(data={'text': 'Текст'}, files={'image': upload})
+        return form, form.is_valid()
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_image_is_rotated_downscaled_and_stripped(self):
+        form, valid = self.clean(
+            make_image('photo.jpg', 'JPEG', orientation=6))
+        self.assertTrue(valid, form.errors)
+        with Image.open(form.cleaned_data['image']) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (50, 100))
+            self.assertNotIn('exif', image.info)
+
+    def test_unknown_format_is_converted(self):
+        form, valid = self.clean(make_image('picture.bmp', 'BMP'))
+        self.assertTrue(valid, form.errors)
+        self.assertEqual(form.cleaned_data['image'].name, 'picture.jpg')
+
+    @override_settings(POST_IMAGE_MAX_BYTES=100)
+    def test_large_file_is_rejected(self):
+        form, valid = self.clean(make_image('photo.jpg', 'JPEG'))
+        self.assertFalse(valid)
+        self.assertTrue(form.has_error('image', 'file_too_large'))
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1000)
+    def test_large_dimensions_are_rejected(self):
+        form, valid = self.clean(make_image('photo.png', 'PNG'))
+        self.assertFalse(valid)
+        self.assertTrue(form.has_error('image', 'image_too_large'))
+
+    def test_truncated_image_is_rejected(self):
+        data = make_image('photo.jpg', 'JPEG').read()
+        form, valid = self.clean(
+            SimpleUploadedFile('photo.jpg', data[:len(data) // 2]))
+        self.assertFalse(valid)
+        self.assertTrue(form.has_error('image', 'invalid_image'))
+
+    @skipUnless(features.check('webp'), 'Pillow собран без WebP')
+    def test_webp_copy_is_saved_next_to_image(self):
+        name = default_storage.save(
+            'posts/photo.jpg', make_image('photo.jpg', 'JPEG'))
+        webp = images.save_webp(name)
+        self.assertEqual(webp, 'posts/photo.jpg.webp')
+        with default_storage.open(webp) as file, Image.open(file) as image:
+            self.assertEqual(image.format, 'WEBP')
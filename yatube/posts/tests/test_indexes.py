@@ -0,0 +1,93 @@
+import re
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import view_counter
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Полный проход по таблице без индекса или сортировка во временном B-дереве.
+BAD_PLAN = re.compile(
+    r'^SCAN (TABLE )?posts_\w+$|USE TEMP B-TREE FOR (RIGHT PART OF )?ORDER BY')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+@override_settings(FEED_PAGINATION='cursor', COMMENTS_PAGE_LIMIT=3)
+class FeedQueryPlanTest(TestCase):
+    """Основные запросы лент читают диапазон индекса без сортировки."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='group',
+            description='Описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(15):
+            Post.objects.create(
+                text=f'Пост {number}', author=cls.author, group=cls.group)
+        cls.post = Post.objects.latest('pk')
+        for number in range(5):
+            Comment.objects.create(
+                text=f'Комментарий {number}', post=cls.post,
+                author=cls.reader)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def tearDown(self):
+        view_counter.discard()
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def feed_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        queries = [
+            query['sql'] for query in context.captured_queries
+            if 'ORDER BY' in query['sql'] and '"posts_' in query['sql']
+        ]
+        self.assertTrue(queries, f'{url}: основной запрос не найден')
+        return response, queries
+
+    def assertIndexedPlan(self, url, params=None):
+        response, queries = self.feed_queries(url, params)
+        for sql in queries:
+            plan = self.explain(sql)
+            with self.subTest(url=url, params=params, plan=plan):
+                self.assertFalse(
+                    any(BAD_PLAN.search(step) for step in plan), sql)
+        return response
+
+    def test_feed_queries_use_indexes(self):
+        urls = (
+            (reverse('posts:index'), 'page_obj'),
+            (reverse('posts:group_list', args=(self.group.slug,)),
+             'page_obj'),
+            (reverse('posts:profile', args=(self.author.username,)),
+             'page_obj'),
+            (reverse('posts:follow_index'), 'page_obj'),
+            (reverse('posts:post_detail', args=(self.post.pk,)), 'comments'),
+        )
+        for url, page_name in urls:
+            response = self.assertIndexedPlan(url)
+            next_cursor = response.context[page_name].next_cursor
+            self.assertIsNotNone(next_cursor, url)
+            param = 'comments' if page_name == 'comments' else 'cursor'
+            self.assertIndexedPlan(url, {param: next_cursor})
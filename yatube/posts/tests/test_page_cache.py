@@ -0,0 +1,111 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import page_cache
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+class AnonymousPageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый текст', author=cls.user, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        page_cache.reset_stats()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_cached_page_skips_database(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.user.username,)),
+            reverse('about:author'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                first = self.guest_client.get(url)
+                with self.assertNumQueries(0):
+                    second = self.guest_client.get(url)
+                self.assertEqual(second.status_code, 200)
+                self.assertEqual(first.content, second.content)
+
+    def test_post_save_invalidates_page(self):
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Измененный текст'
+        post.save()
+        self.assertContains(self.guest_client.get(url), 'Измененный текст')
+
+    def test_stale_page_served_while_rebuilding(self):
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        Post.objects.create(text='Новый пост', author=self.user)
+        key = page_cache._page_key(self.guest_client.get(url).wsgi_request)
+        cache.add(page_cache.LOCK_KEY.format(key), 1)
+        Post.objects.create(text='Еще один пост', author=self.user)
+        response = self.guest_client.get(url)
+        self.assertContains(response, 'Новый пост')
+        self.assertNotContains(response, 'Еще один пост')
+        self.assertEqual(page_cache.stats()['stale'], 1)
+
+    def test_authorized_user_is_not_served_from_cache(self):
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        response = self.authorized_client.get(url)
+        self.assertContains(response, self.user.username)
+        self.assertIn('page_obj', response.context)
+
+    def test_pages_with_csrf_token_are_not_cached(self):
+        url = reverse('users:login')
+        with self.settings(PAGE_CACHE_ROUTES={'users:login': 60}):
+            self.guest_client.get(url)
+            response = self.guest_client.get(url)
+        self.assertIsNotNone(response.context)
+        self.assertEqual(page_cache.stats()['hit'], 0)
+
+    def test_conditional_request_to_cached_page(self):
+        url = reverse('posts:index')
+        etag = self.guest_client.get(url)['ETag']
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_stats_command(self):
+        url = reverse('about:tech')
+        self.guest_client.get(url)
+        self.guest_client.get(url)
+        out = StringIO()
+        call_command('page_cache_stats', reset=True, stdout=out)
+        self.assertIn('Попаданий: 1', out.getvalue())
+        self.assertIn('промахов: 1', out.getvalue())
+        self.assertEqual(
+            page_cache.stats(), {'hit': 0, 'stale': 0, 'miss': 0})
+
+    def test_stats_are_written_in_batches(self):
+        url = reverse('about:tech')
+        with mock.patch.object(page_cache, 'STATS_FLUSH_EVERY', 3):
+            self.guest_client.get(url)
+            self.guest_client.get(url)
+            self.assertIsNone(cache.get(page_cache.STATS_KEY.format('hit')))
+            self.guest_client.get(url)
+        self.assertEqual(cache.get(page_cache.STATS_KEY.format('hit')), 2)
+        self.assertEqual(cache.get(page_cache.STATS_KEY.format('miss')), 1)
@@ -0,0 +1,129 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.testing import QueryBudgetMixin
+
+from .. import urls, view_counter
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ViewQueryBudgetTest(QueryBudgetMixin, TestCase):
+    """Число запросов каждого представления не зависит от объёма данных."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='group',
+            description='Описание',
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Пост {number}', author=cls.author, group=cls.group)
+            for number in range(30)
+        )
+        cls.post = Post.objects.latest('pk')
+        commenters = [
+            User.objects.create_user(username=f'commenter{number}')
+            for number in range(10)
+        ]
+        Comment.objects.bulk_create(
+            Comment(text=f'Комментарий {number}', post=cls.post,
+                    author=commenters[number % len(commenters)])
+            for number in range(30)
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.bulk_create(
+            Follow(user=commenter, author=cls.author)
+            for commenter in commenters
+        )
+
+    def setUp(self):
+        cache.clear()
+        # Запись накопленных просмотров не должна попасть в бюджет.
+        view_counter.discard()
+        self.guest_client = Client()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def tearDown(self):
+        view_counter.discard()
+
+    def budgets(self):
+        """(клиент, метод, адрес, данные, бюджет) для каждого маршрута."""
+        post_id = self.post.pk
+        return {
+            'index': (
+                self.guest_client, 'get', reverse('posts:index'), None, 2),
+            'trending': (
+                self.reader_client, 'get', reverse('posts:trending'), None, 4),
+            'group_list': (
+                self.guest_client, 'get',
+                reverse('posts:group_list', args=(self.group.slug,)),
+                None, 3),
+            'profile': (
+                self.reader_client, 'get',
+                reverse('posts:profile', args=(self.author.username,)),
+                None, 6),
+            'profile_followers': (
+                self.guest_client, 'get',
+                reverse('posts:profile_followers',
+                        args=(self.author.username,)),
+                None, 2),
+            'profile_following': (
+                self.guest_client, 'get',
+                reverse('posts:profile_following',
+                        args=(self.reader.username,)),
+                None, 2),
+            'post_detail': (
+                self.reader_client, 'get',
+                reverse('posts:post_detail', args=(post_id,)), None, 5),
+            'post_search': (
+                self.guest_client, 'get', reverse('posts:post_search'),
+                {'q': 'пост', 'group': self.group.slug}, 3),
+            'post_create': (
+                self.author_client, 'get',
+                reverse('posts:post_create'), None, 5),
+            'post_edit': (
+                self.author_client, 'get',
+                reverse('posts:post_edit', args=(post_id,)), None, 6),
+            'post_comments': (
+                self.guest_client, 'get',
+                reverse('posts:post_comments', args=(post_id,)), None, 2),
+            'add_comment': (
+                self.reader_client, 'post',
+                reverse('posts:add_comment', args=(post_id,)),
+                {'text': 'Новый комментарий'}, 8),
+            'follow_index': (
+                self.reader_client, 'get',
+                reverse('posts:follow_index'), None, 6),
+            'profile_follow': (
+                self.author_client, 'get',
+                reverse('posts:profile_follow', args=(self.reader.username,)),
+                None, 13),
+            'profile_unfollow': (
+                self.reader_client, 'get',
+                reverse('posts:profile_unfollow',
+                        args=(self.author.username,)),
+                None, 11),
+        }
+
+    def test_every_route_has_budget(self):
+        names = {pattern.name for pattern in urls.urlpatterns}
+        self.assertEqual(names, set(self.budgets()))
+
+    def test_views_stay_within_budget(self):
+        for name, (client, method, url, data, budget) in (
+                self.budgets().items()):
+            cache.clear()
+            with self.subTest(view=name):
+                with self.assertQueryBudget(budget):
+                    getattr(client, method)(url, data)
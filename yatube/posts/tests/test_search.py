@@ -0,0 +1,115 @@
+import sqlite3
+from unittest import mock, skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from .. import search
+from ..models import Comment, Group, Post
+from ..signals import restore_search_triggers
+
+User = get_user_model()
+
+
+@skipUnless(search.fts_available(), 'FTS5 есть только в SQLite')
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='group',
+            description='Описание',
+        )
+        cls.best = Post.objects.create(
+            author=cls.author, group=cls.group,
+            text='Ёжик в тумане. Ёжик ищет лошадку.')
+        cls.weak = Post.objects.create(
+            author=cls.other,
+            text='Длинный пост о прогулке, где в конце встречается ежик, '
+                 'а до этого много других слов про лес и реку.')
+        Post.objects.create(author=cls.author, text='Про котов')
+        cls.comment = Comment.objects.create(
+            author=cls.other, post=cls.best, text='Ёжики — лучшие')
+
+    def setUp(self):
+        self.client = Client()
+
+    def find(self, **params):
+        response = self.client.get(reverse('posts:post_search'), params)
+        return list(response.context['page_obj'])
+
+    def test_ranked_prefix_search(self):
+        self.assertEqual(self.find(q='ЕЖИК'), [self.best, self.weak])
+        self.assertEqual(self.find(q='лошад'), [self.best])
+        self.assertEqual(self.find(q='"*:'), [])
+
+    def test_filters(self):
+        self.assertEqual(self.find(q='ежик', group='group'), [self.best])
+        self.assertEqual(self.find(q='ежик', author='other'), [self.weak])
+
+    def test_comments_scope(self):
+        self.assertEqual(
+            self.find(q='ежики', scope='comments'), [self.comment])
+
+    def test_index_follows_table_changes(self):
+        Post.objects.filter(pk=self.weak.pk).update(text='Про собак')
+        self.assertEqual(self.find(q='ежик'), [self.best])
+        self.assertEqual(self.find(q='собак'), [self.weak])
+        Post.objects.filter(pk=self.best.pk).delete()
+        self.assertEqual(self.find(q='ежик'), [])
+
+    @override_settings(PAGE_LIMIT=2)
+    def test_cursor_pagination(self):
+        posts = Post.objects.bulk_create(
+            Post(author=self.author, text=f'Ежик номер {number}')
+            for number in range(5)
+        )
+        self.assertEqual(len(posts), 5)
+        url = reverse('posts:post_search')
+        seen = []
+        params = {'q': 'ежик'}
+        while True:
+            page = self.client.get(url, params).context['page_obj']
+            seen.extend(page)
+            if not page.has_next():
+                break
+            params['cursor'] = page.next_cursor
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(len(set(seen)), 7)
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'лошадку'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.best])
+
+    def test_triggers_are_restored_after_migrate(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER posts_post_fts_ai')
+        restore_search_triggers(sender=None, using='default')
+        post = Post.objects.create(author=self.author, text='Новый ежик')
+        self.assertIn(post, self.find(q='новый'))
+
+
+class Fts5ProbeTest(SimpleTestCase):
+    def test_sqlite_without_fts5(self):
+        probe = mock.Mock()
+        probe.execute.side_effect = sqlite3.OperationalError(
+            'no such module: fts5')
+        database = mock.Mock(OperationalError=sqlite3.OperationalError)
+        database.connect.return_value = probe
+        self.assertFalse(search._sqlite_has_fts5.__wrapped__(database))
+        probe.close.assert_called_once()
+
+    @override_settings(SEARCH_BACKEND='auto')
+    def test_auto_backend_falls_back_to_memory(self):
+        with mock.patch.object(search, '_sqlite_has_fts5', return_value=False):
+            self.assertFalse(search.fts_available())
+            self.assertEqual(search.backend(), 'memory')
@@ -0,0 +1,112 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from .. import suggestions
+from ..models import Comment, Follow, FollowSuggestion, Post
+
+User = get_user_model()
+
+
+def create_graph():
+    """reader → writer → (poet, novelist); critic комментирует с reader."""
+    users = {
+        name: User.objects.create_user(username=name)
+        for name in ('reader', 'writer', 'poet', 'novelist', 'critic',
+                     'silent')
+    }
+    for name in ('writer', 'poet', 'novelist', 'critic'):
+        Post.objects.create(author=users[name], text=f'Пост {name}')
+    Follow.objects.create(user=users['reader'], author=users['writer'])
+    Follow.objects.create(user=users['writer'], author=users['poet'])
+    Follow.objects.create(user=users['writer'], author=users['novelist'])
+    Follow.objects.create(user=users['critic'], author=users['poet'])
+    Follow.objects.create(user=users['critic'], author=users['silent'])
+    post = Post.objects.get(author=users['writer'])
+    Comment.objects.create(post=post, author=users['reader'], text='Да')
+    Comment.objects.create(post=post, author=users['critic'], text='Нет')
+    return users
+
+
+class SuggestTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = create_graph()
+
+    def suggested(self, name):
+        graph = suggestions.Graph()
+        return [
+            (score, User.objects.get(pk=author_id).username)
+            for score, author_id in suggestions.suggest(
+                graph, self.users[name].pk, 10)
+        ]
+
+    def test_friends_of_friends_and_co_commenters(self):
+        self.assertEqual(
+            self.suggested('reader'),
+            [(1, 'poet'), (1, 'novelist'),
+             (suggestions.COMMENT_WEIGHT, 'critic')])
+
+    def test_followed_and_authors_without_posts_are_skipped(self):
+        # silent без постов, writer уже в подписках.
+        names = [name for _, name in self.suggested('critic')]
+        self.assertNotIn('silent', names)
+        self.assertNotIn('writer', names)
+        self.assertNotIn('critic', names)
+
+    def test_users_newer_than_size_are_loaded(self):
+        # Пользователи появились после того, как граф прочитал наибольший id.
+        with mock.patch.object(suggestions, '_max_id', return_value=1):
+            suggested = self.suggested('reader')
+        self.assertEqual(
+            suggested,
+            [(1, 'poet'), (1, 'novelist'),
+             (suggestions.COMMENT_WEIGHT, 'critic')])
+
+    def test_follow_index_shows_suggestions(self):
+        call_command('compute_suggestions', workers=0, stdout=StringIO())
+        client = Client()
+        client.force_login(self.users['reader'])
+        response = client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            [row.author for row in response.context['suggestions']],
+            [self.users['poet'], self.users['novelist'],
+             self.users['critic']])
+        Follow.objects.create(
+            user=self.users['reader'], author=self.users['poet'])
+        response = client.get(reverse('posts:follow_index'))
+        self.assertNotIn(
+            self.users['poet'],
+            [row.author for row in response.context['suggestions']])
+
+
+class ComputeSuggestionsCommandTest(TransactionTestCase):
+    def setUp(self):
+        self.users = create_graph()
+
+    def test_pool_matches_single_process(self):
+        call_command('compute_suggestions', workers=0, stdout=StringIO())
+        single = sorted(FollowSuggestion.objects.values_list(
+            'user_id', 'author_id', 'score'))
+        out = StringIO()
+        call_command('compute_suggestions', workers=2, chunk_size=1,
+                     stdout=out)
+        self.assertEqual(sorted(FollowSuggestion.objects.values_list(
+            'user_id', 'author_id', 'score')), single)
+        self.assertIn(f'рекомендаций: {len(single)}', out.getvalue())
+
+    def test_stale_suggestions_are_removed(self):
+        call_command('compute_suggestions', workers=0, stdout=StringIO())
+        reader = self.users['reader']
+        self.assertTrue(FollowSuggestion.objects.filter(user=reader).exists())
+        Follow.objects.filter(user=reader).delete()
+        Comment.objects.filter(author=reader).delete()
+        call_command('compute_suggestions', workers=0, chunk_size=1,
+                     stdout=StringIO())
+        self.assertFalse(
+            FollowSuggestion.objects.filter(user=reader).exists())
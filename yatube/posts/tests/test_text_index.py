@@ -0,0 +1,159 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import (Client, SimpleTestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+
+from .. import text_index
+from ..models import Group, Post
+from ..stemmer import stem
+from ..text_index import InvertedIndex
+
+User = get_user_model()
+
+
+class StemmerTest(SimpleTestCase):
+    def test_word_forms_share_stem(self):
+        for forms in (
+            ('ёжик', 'ежики', 'ёжика', 'ЕЖИКОМ'),
+            ('красивая', 'красивый', 'красивыми'),
+            ('читали', 'читать', 'читает'),
+        ):
+            with self.subTest(forms=forms):
+                self.assertEqual(len({stem(word) for word in forms}), 1)
+
+    def test_other_words_are_kept(self):
+        self.assertEqual(stem('Django'), 'django')
+        self.assertEqual(stem('2022'), '2022')
+
+
+class InvertedIndexTest(SimpleTestCase):
+    def setUp(self):
+        self.index = InvertedIndex()
+        self.index.add(1, 'Ёжик в тумане. Ёжик ищет лошадку.', 10, 5)
+        self.index.add(2, 'Длинный рассказ о лесе, где однажды появился '
+                          'ежик и много других зверей.', 11, 0)
+        self.index.add(3, 'Про котов', 10, 0)
+
+    def pks(self, *args, **kwargs):
+        return [pk for _, pk in self.index.search(*args, **kwargs)]
+
+    def test_search_ranks_and_requires_all_words(self):
+        self.assertEqual(self.pks('ежики'), [1, 2])
+        self.assertEqual(self.pks('ежик лошадки'), [1])
+        self.assertEqual(self.pks('ежик собака'), [])
+        self.assertEqual(self.pks('!!!'), [])
+
+    def test_filters(self):
+        self.assertEqual(self.pks('ежик', author_id=11), [2])
+        self.assertEqual(self.pks('ежик', group_id=5), [1])
+
+    def test_update_and_remove(self):
+        self.index.add(3, 'Кот встретил ежика', 10, 0)
+        self.assertEqual(self.pks('котов'), [3])
+        self.assertIn(3, self.pks('ежик'))
+        self.index.remove(1)
+        self.assertEqual(sorted(self.pks('ежик')), [2, 3])
+        self.assertEqual(len(self.index), 2)
+
+    def test_snapshot_is_mapped_and_stays_writable(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'search.idx')
+        self.index.seq = 42
+        self.index.save(path)
+
+        loaded = InvertedIndex.load(path)
+        self.assertIsInstance(loaded.postings[0][0], memoryview)
+        self.assertEqual(loaded.seq, 42)
+        self.assertEqual(loaded.search('ежик'), self.index.search('ежик'))
+
+        loaded.remove(1)
+        loaded.add(4, 'Ещё один ёжик', 12, 0)
+        self.assertEqual(sorted(pk for _, pk in loaded.search('ежик')),
+                         [2, 4])
+        loaded.save(path)
+        self.assertEqual(len(InvertedIndex.load(path)), 3)
+
+    def test_foreign_file_is_rejected(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'search.idx')
+        with open(path, 'wb') as file:
+            file.write(b'x' * 100)
+        with self.assertRaises(ValueError):
+            InvertedIndex.load(path)
+
+
+@override_settings(SEARCH_BACKEND='memory', PAGE_LIMIT=2)
+class MemorySearchTest(TransactionTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(
+            SEARCH_INDEX_PATH=os.path.join(directory, 'search.idx'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+        text_index.reset()
+        self.addCleanup(text_index.reset)
+        self.author = User.objects.create_user(username='author')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Ёжик в тумане')
+        self.client = Client()
+
+    def find(self, **params):
+        response = self.client.get(reverse('posts:post_search'), params)
+        return list(response.context['page_obj'])
+
+    def test_index_follows_post_changes(self):
+        self.assertEqual(self.find(q='ежики'), [self.post])
+        other = Post.objects.create(author=self.author, text='Ёжики в лесу')
+        self.assertEqual(set(self.find(q='ежик')), {self.post, other})
+        other.text = 'Котики в лесу'
+        other.save()
+        self.assertEqual(self.find(q='ежик'), [self.post])
+        self.assertEqual(self.find(q='котик'), [other])
+        self.post.delete()
+        self.assertEqual(self.find(q='ежик'), [])
+
+    def test_lost_journal_rebuilds_index(self):
+        self.assertEqual(self.find(q='ежик'), [self.post])
+        cache.clear()
+        Post.objects.filter(pk=self.post.pk).update(text='Котик')
+        self.assertEqual(self.find(q='котик'), [self.post])
+
+    def test_filters_and_cursor_pagination(self):
+        for number in range(4):
+            Post.objects.create(author=self.author, text=f'Ёжик {number}')
+        self.assertEqual(
+            self.find(q='ежик', group=self.group.slug), [self.post])
+        self.assertEqual(self.find(q='ежик', author='nobody'), [])
+        url = reverse('posts:post_search')
+        seen = []
+        params = {'q': 'ежик', 'author': 'author'}
+        while True:
+            page = self.client.get(url, params).context['page_obj']
+            seen.extend(page)
+            if not page.has_next():
+                break
+            params['cursor'] = page.next_cursor
+        self.assertEqual(len(set(seen)), 5)
+        self.assertEqual(len(seen), 5)
+
+    def test_command_writes_snapshot(self):
+        call_command('build_search_index', stdout=StringIO())
+        text_index.reset()
+        index = text_index.get_index()
+        self.assertIsNotNone(index.base)
+        self.assertEqual(self.find(q='ежика'), [self.post])
+        self.assertTrue(os.path.exists(settings.SEARCH_INDEX_PATH))
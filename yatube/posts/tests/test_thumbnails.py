@@ -0,0 +1,198 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import transaction
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+
+from .. import thumbnails
+from ..models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPregenerationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def image(self, name='small.gif'):
+        return SimpleUploadedFile(name, SMALL_GIF, content_type='image/gif')
+
+    def test_post_create_schedules_thumbnails(self):
+        with mock.patch('posts.views.thumbnails.schedule') as schedule:
+            self.authorized_client.post(
+                reverse('posts:post_create'),
+                data={'text': 'Пост с картинкой', 'image': self.image()},
+            )
+        post = Post.objects.get(text='Пост с картинкой')
+        schedule.assert_called_once_with(post)
+
+    def test_post_edit_without_new_image_does_not_schedule(self):
+        post = Post.objects.create(author=self.user, text='Пост')
+        with mock.patch('posts.views.thumbnails.schedule') as schedule:
+            self.authorized_client.post(
+                reverse('posts:post_edit', args=(post.pk,)),
+                data={'text': 'Новый текст'},
+            )
+        schedule.assert_not_called()
+
+    def test_command_generates_missing_thumbnails(self):
+        post = Post.objects.create(
+            author=self.user, text='Пост', image=self.image())
+        source = ImageFile(post.image.name, default.storage)
+        self.assertIsNone(default.kvstore.get(source))
+
+        out = StringIO()
+        call_command('generate_thumbnails', workers=0, stdout=out)
+
+        self.assertIsNotNone(default.kvstore.get(source))
+        self.assertEqual(
+            len(default.kvstore._get(source.key, identity='thumbnails')),
+            len(settings.POST_THUMBNAIL_VARIANTS))
+        self.assertIn('с ошибками: 0', out.getvalue())
+
+
+class ThumbnailScheduleTest(TransactionTestCase):
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_without_workers_thumbnails_are_made_on_commit(self):
+        post = Post(image='posts/small.gif')
+        with mock.patch.object(thumbnails, 'generate_safely') as generate:
+            with mock.patch.object(thumbnails, '_get_executor') as executor:
+                with transaction.atomic():
+                    thumbnails.schedule(post)
+                    generate.assert_not_called()
+        generate.assert_called_once_with('posts/small.gif')
+        executor.assert_not_called()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPrefetchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user,
+                text=f'Пост {number}',
+                image=SimpleUploadedFile(
+                    f'small{number}.gif', SMALL_GIF,
+                    content_type='image/gif'),
+            )
+            for number in range(3)
+        ]
+        cls.posts.append(Post.objects.create(author=cls.user, text='Текст'))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        for post in self.posts[:3]:
+            thumbnails.generate(post.image.name)
+
+    def expected_urls(self):
+        geometry, options = settings.POST_THUMBNAIL_VARIANTS[0]
+        return [
+            get_thumbnail(post.image, geometry, **options).url
+            for post in self.posts[:3]
+        ]
+
+    def test_prefetch_reads_cache_once(self):
+        posts = list(Post.objects.filter(pk__in=[p.pk for p in self.posts]))
+        with mock.patch.object(
+                default.kvstore.cache, 'get_many',
+                wraps=default.kvstore.cache.get_many) as get_many:
+            with self.assertNumQueries(0):
+                thumbnails.prefetch(posts)
+        get_many.assert_called_once()
+        by_pk = {post.pk: post for post in posts}
+        self.assertEqual(
+            [by_pk[post.pk].thumbnail.url for post in self.posts[:3]],
+            self.expected_urls())
+        self.assertIsNone(by_pk[self.posts[3].pk].thumbnail)
+
+    def test_missing_thumbnail_is_scheduled_not_rendered(self):
+        post = Post.objects.create(
+            author=self.user, text='Без миниатюры',
+            image=SimpleUploadedFile(
+                'fresh.gif', SMALL_GIF, content_type='image/gif'))
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            with mock.patch.object(thumbnails, 'get_thumbnail') as get:
+                thumbnails.prefetch([post])
+        schedule.assert_called_once_with(post)
+        get.assert_not_called()
+        self.assertEqual(post.thumbnail.url, post.image.url)
+
+    def test_prefetch_falls_back_to_one_query(self):
+        posts = list(Post.objects.filter(pk__in=[p.pk for p in self.posts]))
+        cache.clear()
+        with self.assertNumQueries(1):
+            thumbnails.prefetch(posts)
+        self.assertTrue(all(post.thumbnail for post in posts if post.image))
+
+    def test_index_shows_prefetched_thumbnails(self):
+        response = Client().get(reverse('posts:index'))
+        for url in self.expected_urls():
+            self.assertContains(response, f'src="{url}"')
+
+    def test_private_api_matches_get_thumbnail(self):
+        """Закрытые методы sorl дают то же, что и открытый API."""
+        self.assertTrue(thumbnails.private_api_supported())
+        for geometry, options in settings.POST_THUMBNAIL_VARIANTS:
+            for post in self.posts[:3]:
+                with self.subTest(geometry=geometry, post=post.pk):
+                    expected = get_thumbnail(post.image, geometry, **options)
+                    thumbnail = thumbnails._thumbnail_file(
+                        ImageFile(post.image), geometry, options)
+                    self.assertEqual(thumbnail.name, expected.name)
+                    key = add_prefix(thumbnail.key)
+                    self.assertEqual(
+                        thumbnails._get_many([key]),
+                        {key: default.kvstore._get_raw(key)})
+
+    def test_prefetch_without_private_api(self):
+        posts = list(Post.objects.filter(pk__in=[p.pk for p in self.posts]))
+        with mock.patch.object(thumbnails, 'SORL_PRIVATE_API_VERSIONS', ()):
+            thumbnails.prefetch(posts)
+        by_pk = {post.pk: post for post in posts}
+        self.assertEqual(
+            [by_pk[post.pk].thumbnail.url for post in self.posts[:3]],
+            self.expected_urls())
+        self.assertIsNone(by_pk[self.posts[3].pk].thumbnail)
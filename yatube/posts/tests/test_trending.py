@@ -0,0 +1,77 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import trending, view_counter
+from ..models import Comment, Post
+
+User = get_user_model()
+
+
+class TrendingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.older = Post.objects.create(author=cls.author, text='Старый')
+        cls.newer = Post.objects.create(author=cls.author, text='Новый')
+
+    def setUp(self):
+        cache.clear()
+        view_counter.discard()
+        # Гостям лента отдаётся из кэша страниц, а нужен свежий порядок.
+        self.client.force_login(self.author)
+
+    def tearDown(self):
+        view_counter.discard()
+
+    def feed(self):
+        response = self.client.get(reverse('posts:trending'))
+        return list(response.context['page_obj'])
+
+    def scores(self):
+        return dict(Post.objects.values_list('pk', 'trending_score'))
+
+    def test_new_post_leads(self):
+        self.assertEqual(self.feed(), [self.newer, self.older])
+
+    def test_comment_and_views_raise_post(self):
+        Comment.objects.create(
+            post=self.older, author=self.author, text='Обсуждаем')
+        self.assertEqual(self.feed(), [self.older, self.newer])
+        url = reverse('posts:post_detail', args=(self.newer.pk,))
+        for _ in range(6):
+            self.client.get(url)
+        view_counter.flush()
+        self.assertEqual(self.feed(), [self.newer, self.older])
+
+    def test_old_events_decay(self):
+        # Три комментария два периода полураспада назад весят меньше
+        # одного свежего.
+        moment = timezone.now() - timedelta(
+            seconds=2 * settings.TRENDING_HALF_LIFE)
+        for _ in range(3):
+            trending.record(self.newer.pk, trending.COMMENT_WEIGHT, moment)
+        trending.record(self.older.pk, trending.COMMENT_WEIGHT)
+        self.assertEqual(self.feed(), [self.older, self.newer])
+
+    def test_rescore_matches_incremental_score(self):
+        Comment.objects.create(
+            post=self.older, author=self.author, text='Обсуждаем')
+        view_counter.record(self.newer.pk)
+        view_counter.flush()
+        expected = self.scores()
+        Post.objects.update(trending_score=0)
+        out = StringIO()
+        call_command('rescore_trending', stdout=out)
+        for pk, score in self.scores().items():
+            with self.subTest(pk=pk):
+                self.assertAlmostEqual(score, expected[pk], places=3)
+        self.assertIn('постов: 2', out.getvalue())
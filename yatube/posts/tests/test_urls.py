@@ -1,6 +1,7 @@
 from http import HTTPStatus
 
 from django.test import Client, TestCase
+from posts import view_counter
 from posts.models import Group, Post, User
 
 
@@ -27,6 +28,9 @@ class PostURLTests(TestCase):
             description='Описание группы',
         )
 
+    def tearDown(self):
+        view_counter.discard()
+
     def test_pages_for_everyone(self):
         pages_urls = [
             '/',
@@ -0,0 +1,115 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from .. import view_counter
+from ..models import Post
+
+User = get_user_model()
+
+
+class ViewCounterTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.posts = [
+            Post.objects.create(author=cls.author, text=f'Пост {number}')
+            for number in range(2)
+        ]
+
+    def setUp(self):
+        # id постов повторяются между тестами, чужие просмотры не нужны.
+        view_counter.discard()
+
+    def tearDown(self):
+        view_counter.discard()
+
+    def views(self):
+        return [
+            Post.objects.get(pk=post.pk).views_count for post in self.posts
+        ]
+
+    def test_views_are_written_in_one_query(self):
+        for post, count in zip(self.posts, (3, 2)):
+            for _ in range(count):
+                view_counter.record(post.pk)
+        self.assertEqual(self.views(), [0, 0])
+        with self.assertNumQueries(1):
+            self.assertEqual(view_counter.flush(), 5)
+        self.assertEqual(self.views(), [3, 2])
+        with self.assertNumQueries(0):
+            self.assertEqual(view_counter.flush(), 0)
+
+    @override_settings(VIEW_COUNTER_FLUSH_THRESHOLD=3)
+    def test_flush_on_threshold(self):
+        view_counter.record(self.posts[0].pk)
+        view_counter.record(self.posts[1].pk)
+        self.assertEqual(self.views(), [0, 0])
+        view_counter.record(self.posts[0].pk)
+        self.assertEqual(self.views(), [2, 1])
+
+    def test_flush_on_interval(self):
+        with mock.patch.object(view_counter.time, 'monotonic') as monotonic:
+            monotonic.return_value = 100
+            view_counter.record(self.posts[0].pk)
+            monotonic.return_value = 109
+            view_counter.record(self.posts[0].pk)
+            self.assertEqual(self.views(), [0, 0])
+            monotonic.return_value = 110
+            view_counter.record(self.posts[1].pk)
+        self.assertEqual(self.views(), [2, 1])
+
+    def test_failed_flush_keeps_views(self):
+        view_counter.record(self.posts[0].pk)
+        with mock.patch.object(
+                view_counter, '_write', side_effect=Exception('locked')):
+            with self.assertLogs(view_counter.logger, 'ERROR'):
+                self.assertEqual(view_counter.flush(), 0)
+        self.assertEqual(view_counter.flush(), 1)
+        self.assertEqual(self.views(), [1, 0])
+
+    def test_post_detail_counts_own_view(self):
+        url = reverse('posts:post_detail', args=(self.posts[0].pk,))
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertContains(response, 'Просмотров: 2')
+
+    def test_not_modified_response_counts_view(self):
+        url = reverse('posts:post_detail', args=(self.posts[0].pk,))
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(view_counter.pending(self.posts[0].pk), 2)
+
+    def test_missing_post_is_not_counted(self):
+        url = reverse('posts:post_detail', args=(self.posts[1].pk + 100,))
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(view_counter.pending(self.posts[1].pk + 100), 0)
+
+
+class ViewCounterTimerTest(TransactionTestCase):
+    def setUp(self):
+        view_counter.discard()
+        author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(author=author, text='Пост')
+
+    def tearDown(self):
+        view_counter.discard()
+
+    @override_settings(VIEW_COUNTER_FLUSH_INTERVAL=0.01)
+    def test_timer_flushes_without_further_views(self):
+        view_counter.record(self.post.pk)
+        view_counter._timer.join(5)
+        self.assertEqual(view_counter.pending(self.post.pk), 0)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).views_count, 1)
+
+    def test_flush_cancels_timer(self):
+        view_counter.record(self.post.pk)
+        timer = view_counter._timer
+        view_counter.flush()
+        timer.join(5)
+        self.assertFalse(timer.is_alive())
+        self.assertIsNone(view_counter._timer)
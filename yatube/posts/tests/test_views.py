@@ -1,13 +1,19 @@
 from http import HTTPStatus
+from io import StringIO
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
-from django.test import Client, TestCase
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from ..models import Comment, Follow, Group, Post
+from .. import feed_cache, view_counter
+from ..models import Comment, Follow, Group, Post, TimelineEntry
 
 User = get_user_model()
 
@@ -34,6 +40,9 @@ class PostPagesTests(TestCase):
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
 
+    def tearDown(self):
+        view_counter.discard()
+
     def test_pages_uses_correct_template(self):
         templates_page_names = {
             reverse('posts:group_list',
@@ -193,6 +202,80 @@ class PostPaginatorTests(TestCase):
             self.assertEqual(len(response.context['page_obj']), count_posts)
 
 
+@override_settings(FEED_PAGINATION='cursor')
+class PostCursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Пост {number}', author=cls.user, group=cls.group)
+            for number in range(25)
+        )
+        # Одинаковая дата у части постов проверяет сортировку по id.
+        same_date = Post.objects.order_by('pk').first().pub_date
+        Post.objects.filter(pk__lte=Post.objects.order_by('pk')[7].pk).update(
+            pub_date=same_date)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def walk(self, url):
+        seen = []
+        cursor = ''
+        while True:
+            response = self.guest_client.get(url, {'cursor': cursor})
+            page_obj = response.context['page_obj']
+            seen.extend(post.pk for post in page_obj)
+            if not page_obj.has_next():
+                return seen, page_obj
+            cursor = page_obj.next_cursor
+
+    def test_cursor_pages_cover_feed_in_order(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.user.username,)),
+        )
+        expected = list(Post.objects.order_by(
+            '-pub_date', '-pk').values_list('pk', flat=True))
+        for url in urls:
+            with self.subTest(url=url):
+                seen, last_page = self.walk(url)
+                self.assertEqual(seen, expected)
+                self.assertTrue(last_page.has_previous())
+
+    def test_previous_cursor_returns_previous_page(self):
+        url = reverse('posts:index')
+        first = self.guest_client.get(url).context['page_obj']
+        second = self.guest_client.get(
+            url, {'cursor': first.next_cursor}).context['page_obj']
+        back = self.guest_client.get(
+            url, {'cursor': second.previous_cursor}).context['page_obj']
+        self.assertEqual(len(first), settings.PAGE_LIMIT)
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_page_does_not_count_rows(self):
+        url = reverse('posts:index')
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(url)
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries))
+
+    def test_broken_cursor_shows_first_page(self):
+        response = self.guest_client.get(
+            reverse('posts:index'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+
 class CommentTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -212,6 +295,9 @@ class CommentTest(TestCase):
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
 
+    def tearDown(self):
+        view_counter.discard()
+
     def test_add_comment(self):
         """После успешной отправки комментарий появляется на странице поста."""
         response = self.authorized_client.get(reverse(
@@ -223,6 +309,58 @@ class CommentTest(TestCase):
         self.assertTrue(comment_text, 'Тестовый текст')
 
 
+@override_settings(COMMENTS_PAGE_LIMIT=3)
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Тестовый текст', author=cls.user)
+        Comment.objects.bulk_create(
+            Comment(text=f'Комментарий {number}', post=cls.post,
+                    author=cls.user)
+            for number in range(7)
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def tearDown(self):
+        view_counter.discard()
+
+    def test_post_detail_shows_first_comments(self):
+        response = self.guest_client.get(reverse(
+            'posts:post_detail', args=(self.post.pk,)))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 3)
+        self.assertTrue(comments.has_next())
+        self.assertContains(response, reverse(
+            'posts:post_comments', args=(self.post.pk,)))
+
+    def test_comments_fragment_continues_thread(self):
+        expected = list(self.post.comments.order_by(
+            '-created', '-pk').values_list('text', flat=True))
+        seen = []
+        cursor = ''
+        while True:
+            response = self.guest_client.get(
+                reverse('posts:post_comments', args=(self.post.pk,)),
+                {'cursor': cursor})
+            self.assertTemplateUsed(response, 'posts/includes/comments.html')
+            self.assertNotContains(response, '<html')
+            comments = response.context['comments']
+            seen.extend(comment.text for comment in comments)
+            if not comments.has_next():
+                break
+            cursor = comments.next_cursor
+        self.assertEqual(seen, expected)
+
+    def test_comments_fragment_for_missing_post(self):
+        response = self.guest_client.get(
+            reverse('posts:post_comments', args=(self.post.pk + 100,)))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
 class CacheTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -245,17 +383,159 @@ class CacheTest(TestCase):
 
     def test_cache_index(self):
         """Тест кэширования главной страницы."""
+        cache.clear()
         response = self.authorized_client.get(reverse('posts:index'))
-        post = Post.objects.get(pk=1)
-        post.text = 'Измененный текст'
-        post.save()
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
         second_response = self.authorized_client.get(reverse('posts:index'))
         self.assertEqual(response.content, second_response.content)
-        post.delete()
         cache.clear()
         third_response = self.authorized_client.get(reverse('posts:index'))
         self.assertNotEqual(response.content, third_response.content)
 
+    def test_post_save_invalidates_feeds(self):
+        """Сохранение поста сразу обновляет закэшированные ленты."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.user.username,)),
+        )
+        for url in urls:
+            self.authorized_client.get(url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Измененный текст'
+        post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertContains(response, 'Измененный текст')
+
+    def test_pages_are_cached_separately(self):
+        Post.objects.bulk_create(
+            Post(text=f'Пост {number}', author=self.user)
+            for number in range(settings.PAGE_LIMIT)
+        )
+        cache.clear()
+        first = self.authorized_client.get(reverse('posts:index'))
+        second = self.authorized_client.get(
+            reverse('posts:index') + '?page=2')
+        self.assertContains(second, self.post.text)
+        self.assertNotEqual(first.content, second.content)
+
+
+class FeedVersionCommitTest(TransactionTestCase):
+    def test_bump_repeats_after_commit(self):
+        """Версия, прочитанная до коммита, после него уже устарела."""
+        cache.clear()
+        with transaction.atomic():
+            feed_cache.bump(feed_cache.INDEX)
+            before_commit = feed_cache.get_version(feed_cache.INDEX)
+        self.assertNotEqual(
+            feed_cache.get_version(feed_cache.INDEX), before_commit)
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый текст', author=cls.user, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def tearDown(self):
+        view_counter.discard()
+
+    def pages(self):
+        return (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.user.username,)),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+        )
+
+    def test_unchanged_page_is_not_modified(self):
+        for url in self.pages():
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+
+    def test_feed_revalidation_skips_database(self):
+        url = reverse('posts:index')
+        etag = self.guest_client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_if_modified_since(self):
+        url = reverse('posts:index')
+        last_modified = self.guest_client.get(url)['Last-Modified']
+        response = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_post_save_changes_etag(self):
+        etags = [self.guest_client.get(url)['ETag'] for url in self.pages()]
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Измененный текст'
+        post.save()
+        for url, etag in zip(self.pages(), etags):
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertContains(response, 'Измененный текст')
+
+    def test_comment_changes_only_post_etag(self):
+        etags = [self.guest_client.get(url)['ETag'] for url in self.pages()]
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        expected = (304, 304, 304, 200)
+        for url, etag, status in zip(self.pages(), etags, expected):
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, status)
+
+    def test_etag_depends_on_viewer_and_page(self):
+        url = reverse('posts:index')
+        etag = self.guest_client.get(url)['ETag']
+        self.assertNotEqual(self.reader_client.get(url)['ETag'], etag)
+        self.assertNotEqual(self.guest_client.get(url + '?page=2')['ETag'],
+                            etag)
+
+    def test_follow_changes_etag(self):
+        urls = (
+            reverse('posts:follow_index'),
+            reverse('posts:profile', args=(self.user.username,)),
+        )
+        etags = [self.reader_client.get(url)['ETag'] for url in urls]
+        self.reader_client.get(
+            reverse('posts:profile_follow', args=(self.user.username,)))
+        for url, etag in zip(urls, etags):
+            with self.subTest(url=url):
+                response = self.reader_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_missing_post_has_no_validators(self):
+        response = self.guest_client.get(
+            reverse('posts:post_detail', args=(self.post.pk + 100,)),
+            HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 404)
+
 
 class FollowTest(TestCase):
     @classmethod
@@ -324,3 +604,45 @@ class FollowTest(TestCase):
             new_posts_response.context['page_obj'].number,
             posts_counts,
             'New post was in unsubscribed user\'s feed')
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.old_post = Post.objects.create(
+            author=cls.author, text='Пост до подписки')
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def feed(self):
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        return [post.text for post in response.context['page_obj']]
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        self.reader_client.get(reverse(
+            'posts:profile_follow', args=(self.author.username,)))
+        self.assertEqual(self.feed(), [self.old_post.text])
+        self.reader_client.get(reverse(
+            'posts:profile_unfollow', args=(self.author.username,)))
+        self.assertEqual(self.feed(), [])
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader).exists())
+
+    def test_new_post_fans_out_to_followers(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.author_client.post(
+            reverse('posts:post_create'), data={'text': 'Новый пост'})
+        self.assertEqual(self.feed(), ['Новый пост', self.old_post.text])
+
+    def test_rebuild_timelines_command(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.feed(), [self.old_post.text])
@@ -0,0 +1,378 @@
+"""Поисковый индекс по текстам постов в памяти процесса.
+
+Нужен для СУБД без полнотекстового поиска (``SEARCH_BACKEND = 'memory'``).
+Текст разбивается на слова и приводится к основам стеммером. Для каждого
+терма хранится список постов в ``array('I')`` (четыре байта на пост) и
+частоты терма в тех же позициях. Поиск пересекает списки, начиная с
+самого короткого, и ранжирует посты по BM25.
+
+Снимок индекса (команда ``build_search_index``) — плоский файл из
+массивов uint32. Процесс отображает его в память через ``mmap`` и читает
+списки прямо оттуда, ничего не разбирая, кроме словаря термов; список,
+который нужно изменить, копируется в обычный массив при первой записи.
+
+Изменения постов пишутся в журнал в кэше: номер изменения → id поста.
+Перед поиском процесс дочитывает журнал и переиндексирует изменённые
+посты одним запросом. Если журнал или его записи вытеснены из кэша,
+журнал начинает новую эпоху, и индекс строится заново.
+"""
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+import uuid
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Post
+from .stemmer import stem
+
+WORD = re.compile(r'\w+')
+# Параметры BM25 те же, что у bm25() в SQLite FTS5.
+K1 = 1.2
+B = 0.75
+
+MAGIC = b'YTSI'
+FORMAT_VERSION = 1
+# Сигнатура, версия, эпоха журнала, число термов, число постов, сумма
+# длин постов, номер журнала, длина списка термов постов, длина списков
+# постов, размер словаря термов в байтах.
+HEADER = struct.Struct('<4sI16sIIQQQQQ')
+
+JOURNAL_EPOCH = 'search-index:epoch'
+JOURNAL_SEQ = 'search-index:seq'
+JOURNAL_ENTRY = 'search-index:change:{}'
+JOURNAL_TIMEOUT = 24 * 60 * 60
+# При большем отставании дешевле построить индекс заново.
+MAX_REPLAY = 10_000
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def tokenize(text):
+    return [stem(word) for word in WORD.findall(text.lower())]
+
+
+def _contains(docs, pk):
+    position = bisect_left(docs, pk)
+    return position < len(docs) and docs[position] == pk
+
+
+class InvertedIndex:
+    def __init__(self):
+        self.terms = {}
+        # Номер терма → (id постов по возрастанию, частоты терма).
+        self.postings = []
+        # Посты из снимка: массивы id, длин, авторов, групп и термов.
+        self.base = None
+        # Посты, добавленные или удалённые (None) после снимка.
+        self.docs = {}
+        self.count = 0
+        self.total_length = 0
+        self.epoch = None
+        self.seq = 0
+        self.lock = threading.RLock()
+        self._mapped = None
+
+    def __len__(self):
+        return self.count
+
+    def _base_position(self, pk):
+        if self.base is None:
+            return None
+        ids = self.base[0]
+        position = bisect_left(ids, pk)
+        if position < len(ids) and ids[position] == pk:
+            return position
+        return None
+
+    def _doc(self, pk):
+        """(длина, автор, группа, термы) поста или ``None``."""
+        if pk in self.docs:
+            return self.docs[pk]
+        position = self._base_position(pk)
+        if position is None:
+            return None
+        ids, lengths, authors, groups, offsets, terms = self.base
+        return (lengths[position], authors[position], groups[position],
+                terms[offsets[position]:offsets[position + 1]])
+
+    def _pks(self):
+        if self.base is not None:
+            for pk in self.base[0]:
+                if pk not in self.docs:
+                    yield pk
+        for pk, doc in self.docs.items():
+            if doc is not None:
+                yield pk
+
+    def _term_id(self, term):
+        term_id = self.terms.get(term)
+        if term_id is None:
+            term_id = self.terms[term] = len(self.postings)
+            self.postings.append((array('I'), array('I')))
+        return term_id
+
+    def _writable(self, term_id):
+        docs, freqs = self.postings[term_id]
+        if isinstance(docs, memoryview):
+            # Список из снимка только для чтения: копируем при записи.
+            docs, freqs = array('I', docs), array('I', freqs)
+            self.postings[term_id] = (docs, freqs)
+        return docs, freqs
+
+    def add(self, pk, text, author_id, group_id):
+        with self.lock:
+            self.remove(pk)
+            counts = Counter(tokenize(text))
+            term_ids = array('I')
+            for term, freq in counts.items():
+                term_id = self._term_id(term)
+                docs, freqs = self._writable(term_id)
+                position = bisect_left(docs, pk)
+                docs.insert(position, pk)
+                freqs.insert(position, freq)
+                term_ids.append(term_id)
+            length = sum(counts.values())
+            self.docs[pk] = (length, author_id or 0, group_id or 0, term_ids)
+            self.count += 1
+            self.total_length += length
+
+    def remove(self, pk):
+        with self.lock:
+            doc = self._doc(pk)
+            if doc is None:
+                return
+            for term_id in doc[3]:
+                docs, freqs = self._writable(term_id)
+                position = bisect_left(docs, pk)
+                if position < len(docs) and docs[position] == pk:
+                    del docs[position]
+                    del freqs[position]
+            self.docs[pk] = None
+            self.count -= 1
+            self.total_length -= doc[0]
+
+    def search(self, text, author_id=None, group_id=None):
+        """Подходящие посты: список ``(-релевантность, pk)`` по возрастанию.
+
+        Пост подходит, если в нём есть все слова запроса.
+        """
+        with self.lock:
+            lists = []
+            for term in set(tokenize(text)):
+                term_id = self.terms.get(term)
+                if term_id is None:
+                    return []
+                lists.append(self.postings[term_id])
+            if not lists:
+                return []
+            lists.sort(key=lambda posting: len(posting[0]))
+            candidates = list(lists[0][0])
+            for docs, freqs in lists[1:]:
+                candidates = [pk for pk in candidates if _contains(docs, pk)]
+            average = self.total_length / max(self.count, 1)
+            ranking = []
+            for pk in candidates:
+                length, author, group, terms = self._doc(pk)
+                if author_id is not None and author != author_id:
+                    continue
+                if group_id is not None and group != group_id:
+                    continue
+                score = 0.0
+                for docs, freqs in lists:
+                    found = len(docs)
+                    idf = math.log(
+                        1 + (self.count - found + 0.5) / (found + 0.5))
+                    freq = freqs[bisect_left(docs, pk)]
+                    score += idf * freq * (K1 + 1) / (
+                        freq + K1 * (1 - B + B * length / average))
+                ranking.append((-score, pk))
+            ranking.sort()
+            return ranking
+
+    def save(self, path):
+        """Записывает снимок индекса; файл заменяется атомарно."""
+        with self.lock:
+            ids, lengths, authors, groups = (array('I') for _ in range(4))
+            offsets, doc_terms = array('I', [0]), array('I')
+            for pk in sorted(self._pks()):
+                length, author, group, terms = self._doc(pk)
+                ids.append(pk)
+                lengths.append(length)
+                authors.append(author)
+                groups.append(group)
+                doc_terms.extend(terms)
+                offsets.append(len(doc_terms))
+            term_offsets = array('I', [0])
+            all_docs, all_freqs = array('I'), array('I')
+            for docs, freqs in self.postings:
+                all_docs.extend(docs)
+                all_freqs.extend(freqs)
+                term_offsets.append(len(all_docs))
+            names = [None] * len(self.terms)
+            for term, term_id in self.terms.items():
+                names[term_id] = term
+            blob = '\n'.join(names).encode()
+            header = HEADER.pack(
+                MAGIC, FORMAT_VERSION, bytes.fromhex(self.epoch or '0' * 32),
+                len(names), len(ids),
+                self.total_length, self.seq, len(doc_terms), len(all_docs),
+                len(blob),
+            )
+            temporary = f'{path}.tmp'
+            with open(temporary, 'wb') as file:
+                file.write(header)
+                for part in (ids, lengths, authors, groups, offsets,
+                             doc_terms, term_offsets, all_docs, all_freqs):
+                    part.tofile(file)
+                file.write(blob)
+            os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        """Открывает снимок через ``mmap``; ``ValueError`` для чужого файла."""
+        with open(path, 'rb') as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        (magic, version, epoch, term_count, doc_count, total_length, seq,
+         doc_terms_size, postings_size, blob_size) = HEADER.unpack_from(view)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f'{path}: не снимок поискового индекса')
+        position = HEADER.size
+
+        def take(size):
+            nonlocal position
+            end = position + size * 4
+            part = view[position:end].cast('I')
+            position = end
+            return part
+
+        index = cls()
+        index._mapped = mapped
+        ids, lengths, authors, groups = (take(doc_count) for _ in range(4))
+        offsets = take(doc_count + 1)
+        index.base = (ids, lengths, authors, groups, offsets,
+                      take(doc_terms_size))
+        term_offsets = take(term_count + 1)
+        all_docs, all_freqs = take(postings_size), take(postings_size)
+        names = bytes(view[position:position + blob_size]).decode()
+        index.terms = {
+            term: term_id
+            for term_id, term in enumerate(names.split('\n') if names else ())
+        }
+        index.postings = [
+            (all_docs[term_offsets[term_id]:term_offsets[term_id + 1]],
+             all_freqs[term_offsets[term_id]:term_offsets[term_id + 1]])
+            for term_id in range(term_count)
+        ]
+        index.count = doc_count
+        index.total_length = total_length
+        index.epoch = epoch.hex()
+        index.seq = seq
+        return index
+
+
+def _journal_head():
+    """Эпоха журнала и номер его последней записи."""
+    keys = (JOURNAL_EPOCH, JOURNAL_SEQ)
+    head = cache.get_many(keys)
+    if len(head) < len(keys):
+        # Журнал вытеснен: новая эпоха заставит все процессы, видевшие
+        # старую, построить индекс заново.
+        cache.set(JOURNAL_EPOCH, uuid.uuid4().hex, None)
+        cache.add(JOURNAL_SEQ, 0, None)
+        head = cache.get_many(keys)
+    return head.get(JOURNAL_EPOCH), head.get(JOURNAL_SEQ, 0)
+
+
+def _append(post_id):
+    _journal_head()
+    seq = cache.incr(JOURNAL_SEQ)
+    cache.set(JOURNAL_ENTRY.format(seq), post_id, JOURNAL_TIMEOUT)
+
+
+def record(post_id):
+    """Отмечает изменение поста в журнале после коммита транзакции."""
+    transaction.on_commit(lambda: _append(post_id))
+
+
+def _reindex(index, post_ids):
+    found = set()
+    posts = Post.objects.filter(pk__in=post_ids).values_list(
+        'pk', 'text', 'author_id', 'group_id')
+    for pk, text, author_id, group_id in posts:
+        index.add(pk, text, author_id, group_id)
+        found.add(pk)
+    for pk in set(post_ids) - found:
+        index.remove(pk)
+
+
+def build():
+    """Строит индекс по всем постам из базы."""
+    index = InvertedIndex()
+    # Номер журнала берём до чтения постов: изменения, сделанные во время
+    # построения, будут применены повторно, а это безопасно.
+    index.epoch, index.seq = _journal_head()
+    posts = Post.objects.order_by('pk').values_list(
+        'pk', 'text', 'author_id', 'group_id')
+    for pk, text, author_id, group_id in posts.iterator(chunk_size=2000):
+        index.add(pk, text, author_id, group_id)
+    return index
+
+
+def _catch_up(index):
+    epoch, head = _journal_head()
+    if epoch != index.epoch or not 0 <= head - index.seq <= MAX_REPLAY:
+        return build()
+    if head == index.seq:
+        return index
+    seqs = range(index.seq + 1, head + 1)
+    entries = cache.get_many([JOURNAL_ENTRY.format(seq) for seq in seqs])
+    post_ids = []
+    last = index.seq
+    for seq in seqs:
+        post_id = entries.get(JOURNAL_ENTRY.format(seq))
+        if post_id is None:
+            break
+        post_ids.append(post_id)
+        last = seq
+    if len(post_ids) < len(entries):
+        # Пропуск посреди журнала: запись вытеснена, изменение потеряно.
+        return build()
+    # Недостающий хвост, скорее всего, ещё записывается — дочитаем позже.
+    _reindex(index, post_ids)
+    index.seq = last
+    return index
+
+
+def _load_or_build():
+    try:
+        return InvertedIndex.load(settings.SEARCH_INDEX_PATH)
+    except (OSError, ValueError, struct.error):
+        return build()
+
+
+def get_index():
+    """Индекс процесса, догнавший журнал изменений."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = _load_or_build()
+        _index = _catch_up(_index)
+        return _index
+
+
+def reset():
+    """Забывает индекс процесса; следующий поиск загрузит его заново."""
+    global _index
+    with _index_lock:
+        _index = None
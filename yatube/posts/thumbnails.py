@@ -0,0 +1,177 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+Шаблоны строят миниатюры тегом ``{% thumbnail %}``; если миниатюры ещё
+нет, её декодирование и масштабирование происходят прямо в запросе
+первого читателя. Здесь те же варианты создаются заранее: после сохранения
+поста в пуле потоков процесса, а для старых постов — командой
+``generate_thumbnails``.
+
+Лента не вызывает ``{% thumbnail %}`` для каждого поста: ``prefetch``
+вычисляет ключи миниатюр всей страницы и читает их из хранилища ключей
+sorl одним ``get_many``. Для этого нужны закрытые методы sorl; они
+сверены с версиями ``SORL_PRIVATE_API_VERSIONS`` (поведение закрепляют
+тесты), а с другими версиями ``prefetch`` вызывает открытый
+``get_thumbnail`` для каждого поста.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import sorl
+from django.conf import settings
+from django.db import connections, transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import images
+
+logger = logging.getLogger(__name__)
+
+# Версии sorl-thumbnail, с которыми сверены _thumbnail_file и _get_many.
+SORL_PRIVATE_API_VERSIONS = ('12.',)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def generate(name):
+    """Создаёт все варианты миниатюр и копии в WebP для файла."""
+    images.save_webp(name)
+    for geometry, options in settings.POST_THUMBNAIL_VARIANTS:
+        thumbnail = get_thumbnail(name, geometry, **options)
+        images.save_webp(thumbnail.name, default.storage)
+
+
+def generate_safely(name):
+    try:
+        generate(name)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+        return False
+    return True
+
+
+def _background_generate(name):
+    try:
+        generate_safely(name)
+    finally:
+        # У рабочего потока свои соединения с БД, закрываем их сами.
+        connections.close_all()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        return _executor
+
+
+def schedule(post):
+    """Ставит создание миниатюр поста в очередь после коммита.
+
+    При ``THUMBNAIL_WORKERS = 0`` миниатюры создаются сразу после коммита
+    в том же потоке.
+    """
+    if not post.image:
+        return
+    name = post.image.name
+    if not settings.THUMBNAIL_WORKERS:
+        transaction.on_commit(lambda: generate_safely(name))
+        return
+    transaction.on_commit(
+        lambda: _get_executor().submit(_background_generate, name))
+
+
+def private_api_supported():
+    return sorl.__version__.startswith(SORL_PRIVATE_API_VERSIONS)
+
+
+def _thumbnail_file(source, geometry, options):
+    """Файл миниатюры, который вернул бы ``get_thumbnail``.
+
+    Повторяет подготовку опций из ``ThumbnailBackend.get_thumbnail``, но
+    не обращается ни к хранилищу ключей, ни к файлам.
+    """
+    backend = default.backend
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def _get_many(keys):
+    """Сырые значения хранилища ключей sorl за один поход в кэш."""
+    kvstore = default.kvstore
+    if not isinstance(kvstore, cached_db_kvstore.KVStore):
+        return {key: kvstore._get_raw(key) for key in keys}
+    values = {
+        key: value for key, value in kvstore.cache.get_many(keys).items()
+        if value != cached_db_kvstore.EMPTY_VALUE
+    }
+    missing = [key for key in keys if key not in values]
+    if missing:
+        # Что вытеснено из кэша, дочитываем из таблицы тоже одним запросом.
+        stored = dict(KVStoreModel.objects.filter(
+            key__in=missing).values_list('key', 'value'))
+        kvstore.cache.set_many(stored, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(stored)
+    return values
+
+
+def _get_thumbnail(image, geometry, options):
+    try:
+        return get_thumbnail(image, geometry, **options)
+    except Exception:
+        logger.exception('Не удалось получить миниатюру для %s', image)
+        return None
+
+
+def prefetch(posts):
+    """Проставляет постам ``thumbnail`` для основного варианта миниатюр.
+
+    Основной вариант — первый в ``POST_THUMBNAIL_VARIANTS``. Для
+    миниатюр, которых ещё нет в хранилище, ``thumbnail`` — сама картинка,
+    а миниатюры ставятся в очередь ``schedule``; у постов без картинки
+    ``thumbnail`` равен ``None``.
+    """
+    geometry, options = settings.POST_THUMBNAIL_VARIANTS[0]
+    for post in posts:
+        post.thumbnail = None
+    with_images = [post for post in posts if post.image]
+    if not private_api_supported():
+        for post in with_images:
+            post.thumbnail = _get_thumbnail(post.image, geometry, options)
+        return
+    wanted = {}
+    for post in with_images:
+        thumbnail = _thumbnail_file(ImageFile(post.image), geometry, options)
+        wanted.setdefault(add_prefix(thumbnail.key), []).append(post)
+    if not wanted:
+        return
+    found = _get_many(list(wanted))
+    for key, group in wanted.items():
+        if found.get(key):
+            thumbnail = deserialize_image_file(found[key])
+        else:
+            # Не масштабируем картинку в запросе ленты: миниатюру создаст
+            # фоновый поток, а пока показывается исходная картинка.
+            schedule(group[0])
+            thumbnail = group[0].image
+        for post in group:
+            post.thumbnail = thumbnail
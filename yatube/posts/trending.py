@@ -0,0 +1,113 @@
+"""Лента «В тренде»: посты по затухающему весу событий.
+
+Событие с весом ``w`` (публикация, комментарий, просмотр) через время
+``t`` после него стоит ``w · 2^(−t / TRENDING_HALF_LIFE)``. Затухание у
+всех постов одинаковое, поэтому в ``Post.trending_score`` хранится
+логарифм суммы весов, приведённых к постоянной эпохе:
+``ln Σ w · e^((момент − EPOCH) / τ)``, где ``τ = период полураспада / ln 2``.
+Порядок по этой колонке в любой момент совпадает с порядком по текущему
+рейтингу, так что со временем её пересчитывать не нужно, а лента — это
+чтение диапазона индекса ``post_trending_idx``.
+
+Новое событие прибавляется одним ``UPDATE`` через
+``logaddexp(a, b) = max(a, b) + ln(1 + e^(−|a − b|))``; просмотры
+приходят пачками из ``posts.view_counter``. Они накапливаются ещё и в
+``trending_views``: команда ``rescore_trending`` пересчитывает
+публикацию и комментарии по таблицам (например, после удаления
+комментариев) и складывает их с просмотрами.
+"""
+import math
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+from django.utils import timezone
+
+from .models import Comment, Post
+
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+PUBLISH_WEIGHT = 10
+COMMENT_WEIGHT = 5
+VIEW_WEIGHT = 1
+TRENDING_ORDERING = ('-trending_score', '-pk')
+BATCH_SIZE = 500
+
+
+def event_score(weight, moment=None):
+    """Вклад события в рейтинг в логарифмической шкале."""
+    moment = moment or timezone.now()
+    tau = settings.TRENDING_HALF_LIFE / math.log(2)
+    return math.log(weight) + (moment - EPOCH).total_seconds() / tau
+
+
+def logaddexp(a, b):
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def _add(field, value):
+    current = F(field)
+    return Greatest(current, value) + Ln(
+        Value(1.0, output_field=FloatField()) + Exp(-Abs(current - value)))
+
+
+def record(post_id, weight, moment=None):
+    value = Value(event_score(weight, moment), output_field=FloatField())
+    Post.objects.filter(pk=post_id).update(
+        trending_score=_add('trending_score', value))
+
+
+def views_update(counts, moment=None):
+    """Поля для ``update`` постов ``counts = {id: просмотры}`` разом."""
+    value = Case(*(
+        When(pk=post_id, then=Value(
+            event_score(VIEW_WEIGHT * count, moment)))
+        for post_id, count in counts.items()
+    ), output_field=FloatField())
+    return {
+        'trending_score': _add('trending_score', value),
+        'trending_views': _add('trending_views', value),
+    }
+
+
+def record_comment(comment):
+    record(comment.post_id, COMMENT_WEIGHT, comment.created)
+
+
+def initial_score(pub_date=None):
+    """Рейтинг нового поста: одна публикация."""
+    return event_score(PUBLISH_WEIGHT, pub_date)
+
+
+def _comment_scores():
+    """``{id поста: рейтинг комментариев}`` одним проходом по таблице."""
+    scores = {}
+    for post_id, created in Comment.objects.order_by().values_list(
+            'post_id', 'created').iterator():
+        score = event_score(COMMENT_WEIGHT, created)
+        current = scores.get(post_id)
+        scores[post_id] = (
+            score if current is None else logaddexp(current, score))
+    return scores
+
+
+def rescore():
+    """Пересчитывает рейтинг всех постов; возвращает их число."""
+    comments = _comment_scores()
+    count = 0
+    last_pk = 0
+    while True:
+        batch = list(Post.objects.filter(pk__gt=last_pk).order_by(
+            'pk').only('pk', 'pub_date', 'trending_views')[:BATCH_SIZE])
+        if not batch:
+            return count
+        for post in batch:
+            score = logaddexp(
+                initial_score(post.pub_date), post.trending_views)
+            if post.pk in comments:
+                score = logaddexp(score, comments[post.pk])
+            post.trending_score = score
+        Post.objects.bulk_update(batch, ['trending_score'])
+        count += len(batch)
+        last_pk = batch[-1].pk
@@ -1,8 +1,269 @@
+import base64
+import binascii
+import bisect
+import collections.abc
+import json
+
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+FEED_ORDERING = ('-pub_date', '-pk')
+COMMENTS_ORDERING = ('-created', '-pk')
+
+
+class CursorPage(collections.abc.Sequence):
+    """Страница ленты без общего количества записей.
+
+    Записи выбираются при первом обращении, поэтому страница, отданная
+    из фрагментного кэша шаблона, не стоит ни одного запроса.
+    """
+
+    is_cursor = True
+
+    def __init__(self, paginator, cursor=None):
+        self.paginator = paginator
+        self.cursor = cursor
+
+    def __repr__(self):
+        return f'<Cursor page of {len(self)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    @cached_property
+    def _window(self):
+        return self.paginator.fetch(self.cursor)
+
+    @cached_property
+    def object_list(self):
+        return self._window[0]
+
+    @property
+    def next_cursor(self):
+        return self._window[1]
+
+    @property
+    def previous_cursor(self):
+        return self._window[2]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def pack_cursor(direction, values):
+    raw = json.dumps([direction, values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def unpack_cursor(cursor, size):
+    """Направление и значения курсора; ``None``, если курсор испорчен."""
+    padding = '=' * (-len(cursor) % 4)
+    try:
+        raw = base64.urlsafe_b64decode(cursor + padding)
+        direction, values = json.loads(raw.decode())
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        return None
+    if (direction not in ('after', 'before')
+            or not isinstance(values, list)
+            or len(values) != size):
+        return None
+    return direction, values
+
+
+class CursorPaginator:
+    """Keyset-пагинация по полям сортировки.
+
+    Вместо OFFSET и COUNT(*) каждая страница выбирается условием
+    «строго после/до ключа» последней показанной записи, поэтому любая
+    страница стоит столько же, сколько первая. Последнее поле сортировки
+    должно быть уникальным (обычно ``pk``).
+    """
 
+    def __init__(self, object_list, per_page, ordering=FEED_ORDERING):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
 
-def get_page_obj(request, posts):
+    def get_page(self, cursor=None):
+        return CursorPage(self, cursor)
+
+    def fetch(self, cursor=None):
+        """Возвращает записи страницы и курсоры соседних страниц."""
+        position = self.decode_cursor(cursor) if cursor else None
+        if position is None:
+            return self._first_page()
+        direction, values = position
+        if direction == 'before':
+            return self._page_before(values)
+        return self._page_after(values)
+
+    def encode_cursor(self, direction, obj):
+        return pack_cursor(direction, [
+            self._serialize(self._value(obj, name))
+            for name in self._field_names()
+        ])
+
+    def decode_cursor(self, cursor):
+        position = unpack_cursor(cursor, len(self.ordering))
+        if position is None:
+            return None
+        direction, values = position
+        try:
+            values = [
+                self._to_python(name, value)
+                for name, value in zip(self._field_names(), values)
+            ]
+        except ValidationError:
+            return None
+        return direction, values
+
+    def _to_python(self, name, value):
+        meta = self.object_list.model._meta
+        if name == 'pk':
+            return meta.pk.to_python(value)
+        annotation = self.object_list.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field.to_python(value)
+        return meta.get_field(name).to_python(value)
+
+    def _first_page(self):
+        rows = list(self._ordered(reverse=False)[:self.per_page + 1])
+        return self._build(rows[:self.per_page],
+                           has_next=len(rows) > self.per_page,
+                           has_previous=False)
+
+    def _page_after(self, values):
+        queryset = self._ordered(reverse=False).filter(
+            self._seek(values, reverse=False))
+        rows = list(queryset[:self.per_page + 1])
+        return self._build(rows[:self.per_page],
+                           has_next=len(rows) > self.per_page,
+                           has_previous=True)
+
+    def _page_before(self, values):
+        queryset = self._ordered(reverse=True).filter(
+            self._seek(values, reverse=True))
+        rows = list(queryset[:self.per_page + 1])
+        if len(rows) <= self.per_page:
+            # Дошли до начала ленты: показываем полную первую страницу.
+            return self._first_page()
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return self._build(rows, has_next=True, has_previous=True)
+
+    def _build(self, rows, has_next, has_previous):
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = self.encode_cursor('after', rows[-1])
+        if rows and has_previous:
+            previous_cursor = self.encode_cursor('before', rows[0])
+        return rows, next_cursor, previous_cursor
+
+    def _ordered(self, reverse):
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(
+                name[1:] if name.startswith('-') else f'-{name}'
+                for name in ordering
+            )
+        return self.object_list.order_by(*ordering)
+
+    def _seek(self, values, reverse):
+        condition = Q()
+        equal = {}
+        for name, value in zip(self.ordering, values):
+            descending = name.startswith('-') != reverse
+            field = name.lstrip('-')
+            lookup = 'lt' if descending else 'gt'
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return condition
+
+    def _field_names(self):
+        return [name.lstrip('-') for name in self.ordering]
+
+    @staticmethod
+    def _value(obj, name):
+        return obj.pk if name == 'pk' else getattr(obj, name)
+
+    @staticmethod
+    def _serialize(value):
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return value
+
+
+def get_page_obj(request, posts, keyset=False, ordering=FEED_ORDERING):
+    """Страница ленты: нумерованная или, для keyset-лент, по курсору.
+
+    Курсорный режим включается параметром ``?cursor=`` либо для всех
+    keyset-лент настройкой ``FEED_PAGINATION = 'cursor'``.
+    """
+    cursor = request.GET.get('cursor')
+    if keyset and (cursor is not None
+                   or settings.FEED_PAGINATION == 'cursor'):
+        paginator = CursorPaginator(posts, settings.PAGE_LIMIT, ordering)
+        return paginator.get_page(cursor)
     paginator = Paginator(posts, settings.PAGE_LIMIT)
     page_number = request.GET.get('page')
     return paginator.get_page(page_number)
+
+
+def get_comments_page(comments, cursor=None):
+    """Порция комментариев к посту, всегда по курсору."""
+    paginator = CursorPaginator(
+        comments, settings.COMMENTS_PAGE_LIMIT, COMMENTS_ORDERING)
+    return paginator.get_page(cursor)
+
+
+class RankedPaginator:
+    """Курсорная пагинация готового рейтинга.
+
+    ``ranking`` — отсортированный по возрастанию список ключей
+    ``(-релевантность, pk)``, например из поискового индекса в памяти.
+    Объекты страницы загружаются из ``object_list`` одним запросом.
+    """
+
+    def __init__(self, object_list, ranking, per_page):
+        self.object_list = object_list
+        self.ranking = ranking
+        self.per_page = int(per_page)
+
+    def get_page(self, cursor=None):
+        return CursorPage(self, cursor)
+
+    def fetch(self, cursor=None):
+        position = unpack_cursor(cursor, 2) if cursor else None
+        start = 0
+        if position is not None:
+            direction, values = position
+            if all(isinstance(value, (int, float)) for value in values):
+                key = tuple(values)
+                if direction == 'after':
+                    start = bisect.bisect_right(self.ranking, key)
+                else:
+                    start = max(
+                        bisect.bisect_left(self.ranking, key)
+                        - self.per_page, 0)
+        window = self.ranking[start:start + self.per_page]
+        objects = self.object_list.in_bulk([pk for _, pk in window])
+        # Удалённые после построения рейтинга записи просто пропускаем.
+        rows = [objects[pk] for _, pk in window if pk in objects]
+        next_cursor = previous_cursor = None
+        if window and start + self.per_page < len(self.ranking):
+            next_cursor = pack_cursor('after', list(window[-1]))
+        if window and start > 0:
+            previous_cursor = pack_cursor('before', list(window[0]))
+        return rows, next_cursor, previous_cursor
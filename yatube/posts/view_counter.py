@@ -0,0 +1,129 @@
+"""Счётчик просмотров постов с отложенной записью.
+
+``UPDATE`` на каждый открытый пост сделал бы самую частую страницу
+пишущей, а писатели SQLite выстраиваются в очередь за одной блокировкой.
+Поэтому просмотры копятся в памяти процесса и сбрасываются в
+``Post.views_count`` (и в рейтинг трендов) одним ``UPDATE ... CASE`` на
+всю пачку: через ``VIEW_COUNTER_FLUSH_INTERVAL`` секунд после первого
+просмотра в ней (фоновым таймером, даже если запросов больше нет), после
+``VIEW_COUNTER_FLUSH_THRESHOLD`` просмотров — тем запросом, на котором
+порог достигнут, — и при завершении процесса. Прибавляются приращения,
+а не итоговые значения, поэтому воркеры не затирают просмотры друг
+друга. При падении процесса теряются просмотры не дольше одного
+интервала.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, F, IntegerField, Value, When
+
+from . import trending
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+_pending = Counter()
+_total = 0
+_lock = threading.Lock()
+# Когда в пачку попал первый просмотр; None — пачка пуста.
+_started = None
+# Таймер, который сбросит пачку, если её не сбросят раньше.
+_timer = None
+
+
+def _start_timer():
+    global _timer
+    _timer = threading.Timer(
+        settings.VIEW_COUNTER_FLUSH_INTERVAL, _flush_on_timer)
+    _timer.daemon = True
+    _timer.start()
+
+
+def _flush_on_timer():
+    try:
+        flush()
+    finally:
+        # У потока таймера свои соединения с БД, закрываем их сами.
+        connections.close_all()
+
+
+def record(post_id):
+    """Учитывает просмотр; сбрасывает пачку, если пора."""
+    global _started, _total
+    with _lock:
+        _pending[post_id] += 1
+        _total += 1
+        if _started is None:
+            _started = time.monotonic()
+            _start_timer()
+        due = (
+            _total >= settings.VIEW_COUNTER_FLUSH_THRESHOLD
+            or time.monotonic() - _started
+            >= settings.VIEW_COUNTER_FLUSH_INTERVAL
+        )
+    if due:
+        flush()
+
+
+def pending(post_id):
+    """Просмотры поста, ещё не записанные в базу этим процессом."""
+    with _lock:
+        return _pending[post_id]
+
+
+def _write(counts):
+    views = Case(*(
+        When(pk=post_id, then=Value(count))
+        for post_id, count in counts.items()
+    ), output_field=IntegerField())
+    Post.objects.filter(pk__in=counts).update(
+        views_count=F('views_count') + views,
+        **trending.views_update(counts),
+    )
+
+
+def _take():
+    global _started, _total, _timer
+    with _lock:
+        counts = dict(_pending)
+        _pending.clear()
+        _started = None
+        _total = 0
+        if _timer is not None:
+            _timer.cancel()
+            _timer = None
+    return counts
+
+
+def discard():
+    """Забывает накопленные просмотры, не записывая их."""
+    _take()
+
+
+def flush():
+    """Записывает накопленные просмотры; возвращает их число."""
+    global _started, _total
+    counts = _take()
+    if not counts:
+        return 0
+    try:
+        _write(counts)
+    except Exception:
+        # База занята или недоступна: вернём пачку и попробуем позже.
+        logger.exception('Не удалось записать просмотры постов')
+        with _lock:
+            _pending.update(counts)
+            _total += sum(counts.values())
+            if _started is None:
+                _started = time.monotonic()
+                _start_timer()
+        return 0
+    return sum(counts.values())
+
+
+atexit.register(flush)
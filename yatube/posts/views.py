@@ -1,56 +1,171 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
 
-from .forms import CommentForm, PostForm
+from . import (follow_graph, search, suggestions, thumbnails, trending,
+               view_counter)
+from .feed_cache import (INDEX, SUGGESTIONS, conditional_feed,
+                         feed_cache_context, group_scope, post_scope,
+                         profile_scope, timeline_scope, with_viewer)
+from .forms import CommentForm, PostForm, SearchForm
 from .models import Comment, Follow, Group, Post, User
-from .utils import get_page_obj
+from .timeline import TIMELINE_ORDERING, get_timeline
+from .utils import CursorPaginator, get_comments_page, get_page_obj
 
 
+def post_page_scopes(request, post_id):
+    """Области, от которых зависит страница поста.
+
+    Правки поста увеличивают версию профиля автора, комментарии — версию
+    самого поста.
+    """
+    post = Post.objects.filter(pk=post_id).values_list(
+        'author__username', 'group__slug').first()
+    if post is None:
+        return None
+    username, slug = post
+    scopes = [post_scope(post_id), profile_scope(username)]
+    if slug:
+        scopes.append(group_scope(slug))
+    return scopes
+
+
+@conditional_feed(lambda request: with_viewer(request, INDEX))
 def index(request):
     posts = Post.objects.select_related('author', 'group').all()
     context = {
-        'page_obj': get_page_obj(request, posts),
+        'page_obj': get_page_obj(request, posts, keyset=True),
+        **feed_cache_context(request, INDEX, per_viewer=True),
     }
     return render(request, 'posts/index.html', context)
 
 
+def trending_posts(request):
+    """Посты по затухающему рейтингу просмотров и комментариев."""
+    posts = Post.objects.select_related('author', 'group')
+    paginator = CursorPaginator(
+        posts, settings.PAGE_LIMIT, trending.TRENDING_ORDERING)
+    context = {
+        'page_obj': paginator.get_page(request.GET.get('cursor')),
+    }
+    return render(request, 'posts/trending.html', context)
+
+
+@conditional_feed(
+    lambda request, slug: with_viewer(request, group_scope(slug)))
 def group_posts(request, slug):
     """Страница со списком постов."""
     group = get_object_or_404(Group, slug=slug)
     posts = group.posts.select_related('author').all()
     context = {
         'group': group,
-        'page_obj': get_page_obj(request, posts),
+        'page_obj': get_page_obj(request, posts, keyset=True),
+        **feed_cache_context(request, group_scope(slug), per_viewer=True),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional_feed(lambda request, username: [profile_scope(username)])
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('counters'), username=username)
     posts = author.posts.select_related('group').all()
     context = {
         'author': author,
-        'page_obj': get_page_obj(request, posts),
-        'following': request.user.is_authenticated and Follow.objects.filter(
-            user=request.user, author=author
-        ).exists()
+        'page_obj': get_page_obj(request, posts, keyset=True),
+        'following': follow_graph.is_following(request.user, author),
+        **feed_cache_context(request, profile_scope(author.username)),
     }
     return render(request, 'posts/profile.html', context)
 
 
+def profile_followers(request, username):
+    """Подписчики пользователя, новые первыми."""
+    author = get_object_or_404(
+        User.objects.select_related('counters'), username=username)
+    context = {
+        'author': author,
+        'page_obj': follow_graph.followers(author).get_page(
+            request.GET.get('cursor')),
+        'list_kind': 'followers',
+    }
+    return render(request, 'posts/follow_list.html', context)
+
+
+def profile_following(request, username):
+    """Авторы, на которых подписан пользователь, новые первыми."""
+    author = get_object_or_404(
+        User.objects.select_related('counters'), username=username)
+    context = {
+        'author': author,
+        'page_obj': follow_graph.following(author).get_page(
+            request.GET.get('cursor')),
+        'list_kind': 'following',
+    }
+    return render(request, 'posts/follow_list.html', context)
+
+
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    comments = Comment.objects.filter(post=post.id)
+    """Страница поста; просмотр считается и при ответе 304."""
+    response = _post_page(request, post_id)
+    view_counter.record(post_id)
+    return response
+
+
+@conditional_feed(post_page_scopes)
+def _post_page(request, post_id):
+    post = get_object_or_404(
+        Post.objects.select_related('author__counters', 'group'), id=post_id)
+    # Ещё не записанные просмотры и этот, который post_detail учтёт следом.
+    post.views_count += view_counter.pending(post.pk) + 1
+    comments = post.comments.select_related('author')
     form = CommentForm()
     context = {
         'post': post,
         'form': form,
-        'comments': comments,
+        'comments': get_comments_page(comments, request.GET.get('comments')),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    """Следующая порция комментариев HTML-фрагментом."""
+    if not Post.objects.filter(id=post_id).exists():
+        raise Http404
+    comments = Comment.objects.filter(
+        post_id=post_id).select_related('author')
+    context = {
+        'post_id': post_id,
+        'comments': get_comments_page(comments, request.GET.get('cursor')),
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+def post_search(request):
+    """Поиск по постам или комментариям, лучшие совпадения первыми."""
+    form = SearchForm(request.GET or None)
+    context = {'form': form}
+    if form.is_valid():
+        data = form.cleaned_data
+        if data['scope'] == SearchForm.COMMENTS:
+            find = search.search_comments
+        else:
+            find = search.search_posts
+        paginator = find(data['q'], data['group'], data['author'])
+        params = request.GET.copy()
+        params.pop('cursor', None)
+        context.update(
+            scope=data['scope'] or SearchForm.POSTS,
+            page_obj=paginator.get_page(request.GET.get('cursor')),
+            page_query=params.urlencode(),
+        )
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@transaction.atomic
 def post_create(request):
     form = PostForm(request.POST or None,
                     files=request.FILES or None, instance=None)
@@ -59,13 +174,15 @@ def post_create(request):
     post = form.save(commit=False)
     post.author = request.user
     post.save()
+    thumbnails.schedule(post)
     return redirect('posts:profile', username=request.user)
 
 
 @login_required
+@transaction.atomic
 def post_edit(request, post_id):
     post = get_object_or_404(Post, id=post_id)
-    if post.author != request.user:
+    if post.author_id != request.user.pk:
         return redirect('posts:post_detail', post_id)
     form = PostForm(request.POST or None,
                     files=request.FILES or None,
@@ -73,11 +190,14 @@ def post_edit(request, post_id):
                     )
     if not form.is_valid():
         return render(request, 'posts/create_post.html', {'form': form})
-    form.save()
+    post = form.save()
+    if 'image' in form.changed_data:
+        thumbnails.schedule(post)
     return redirect('posts:post_detail', post_id)
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
@@ -90,15 +210,22 @@ def add_comment(request, post_id):
 
 
 @login_required
+@conditional_feed(
+    lambda request: [INDEX, SUGGESTIONS, timeline_scope(request.user.pk)])
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
+    entries = get_timeline(request.user)
+    page_obj = get_page_obj(request, entries, keyset=True,
+                            ordering=TIMELINE_ORDERING)
+    page_obj.object_list = [entry.post for entry in page_obj]
     context = {
-        'page_obj': get_page_obj(request, posts),
+        'page_obj': page_obj,
+        'suggestions': suggestions.for_user(request.user),
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if request.user != author:
@@ -110,6 +237,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     Follow.objects.filter(user=request.user, author=author).delete()
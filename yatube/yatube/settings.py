@@ -18,6 +18,12 @@ SECRET_KEY = '@b+#8=2_+3a@@xr5x*7x8=p54uk33af&i8+sm!ezr6mdqcmnwl'
 
 DEBUG = True
 
+# Кому открыта страница /perf/ с замерами запросов (core.perf).
+INTERNAL_IPS = [
+    '127.0.0.1',
+    '::1',
+]
+
 ALLOWED_HOSTS = [
     'localhost',
     '127.0.0.1',
@@ -40,13 +46,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.perf.PerfMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.db.ConnectionStatsMiddleware',
+    'core.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'posts.page_cache.AnonymousPageCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -54,7 +64,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -71,13 +81,88 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# 'local' — SQLite с настройками по умолчанию, для разработки и тестов;
+# 'production' — WAL и прагмы SQLITE_PRAGMAS для каждого соединения
+# (см. core.db), а запись ждёт чужую блокировку до SQLITE_BUSY_TIMEOUT
+# секунд вместо ошибки «database is locked». Выбирается переменной
+# окружения YATUBE_DB.
+DB_PROFILE = os.environ.get('YATUBE_DB', 'local')
+
+SQLITE_PRAGMAS = {
+    # Читатели не ждут писателя, а писатель — читателей.
+    'journal_mode': 'WAL',
+    # С WAL fsync только при контрольной точке; при сбое питания
+    # теряются последние транзакции, но база остаётся целой.
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение — в килобайтах: 64 МБ страниц на соединение.
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+SQLITE_BUSY_TIMEOUT = 20
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
     }
 }
 
+if DB_PROFILE == 'production':
+    DATABASES['default'].update({
+        'OPTIONS': {'timeout': SQLITE_BUSY_TIMEOUT},
+        'PRAGMAS': SQLITE_PRAGMAS,
+    })
+
+# Соединения с базой (core.db): 'request' — новое на каждый запрос;
+# 'persistent' — своё у каждого потока, живёт DB_CONN_MAX_AGE секунд и
+# проверяется перед запросом; 'pool' — не больше DB_POOL_SIZE общих
+# соединений на процесс для многопоточных серверов, поток ждёт свободное
+# до DB_POOL_TIMEOUT секунд. Выбирается переменной окружения
+# YATUBE_DB_CONNECTIONS.
+DB_CONNECTIONS = os.environ.get(
+    'YATUBE_DB_CONNECTIONS',
+    'persistent' if DB_PROFILE == 'production' else 'request')
+DB_CONN_MAX_AGE = 60
+DB_POOL_SIZE = 8
+DB_POOL_TIMEOUT = 10
+
+if DB_CONNECTIONS == 'persistent':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+    })
+elif DB_CONNECTIONS == 'pool':
+    DATABASES['default']['POOL'] = {
+        'SIZE': DB_POOL_SIZE,
+        'TIMEOUT': DB_POOL_TIMEOUT,
+    }
+
+# Реплики для чтения лент (core.replicas): пути к копиям базы через
+# os.pathsep в переменной окружения YATUBE_DB_REPLICAS. Локально роль
+# реплики играет второй файл SQLite, например копия из ``.backup``.
+DATABASE_REPLICAS = []
+for number, path in enumerate(filter(None, os.environ.get(
+        'YATUBE_DB_REPLICAS', '').split(os.pathsep)), 1):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': path,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+# Маршруты, которые читают с реплик.
+REPLICA_ROUTES = {
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:follow_index',
+}
+# Столько секунд после записи пользователь читает только основную базу.
+REPLICA_PIN_SECONDS = 10
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -105,15 +190,98 @@ USE_TZ = True
 
 PAGE_LIMIT = 10
 
+COMMENTS_PAGE_LIMIT = 20
+
+FEED_CACHE_TIMEOUT = 60 * 60
+
+# Кэш целых страниц для анонимов: имя маршрута -> время жизни, с.
+# Ленты сбрасываются и раньше, при изменении постов.
+PAGE_CACHE_ROUTES = {
+    'posts:index': 60 * 5,
+    'posts:trending': 60,
+    'posts:group_list': 60 * 5,
+    'posts:profile': 60 * 5,
+    'about:author': 60 * 60 * 24,
+    'about:tech': 60 * 60 * 24,
+}
+# Сколько ещё секунд устаревшая страница отдаётся, пока её перестраивают.
+PAGE_CACHE_STALE = 60
+
+# За сколько секунд вес просмотра или комментария в трендах падает вдвое.
+TRENDING_HALF_LIFE = 60 * 60 * 12
+
+# Просмотры постов копятся в памяти процесса и пишутся в базу одним
+# запросом раз в столько секунд или после стольких просмотров.
+VIEW_COUNTER_FLUSH_INTERVAL = 10
+VIEW_COUNTER_FLUSH_THRESHOLD = 100
+
+# 'pages' — нумерованные страницы, 'cursor' — keyset-пагинация лент.
+FEED_PAGINATION = 'pages'
+
+# Поиск: 'fts' — FTS5 в SQLite, 'memory' — индекс в памяти процесса,
+# 'like' — icontains, 'auto' — FTS5, если СУБД его поддерживает.
+SEARCH_BACKEND = 'auto'
+# Снимок индекса в памяти; строится командой build_search_index.
+SEARCH_INDEX_PATH = os.path.join(BASE_DIR, 'search.idx')
+
 MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Ограничения для загружаемых картинок постов и качество перекодирования.
+POST_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40_000_000
+POST_IMAGE_MAX_SIDE = 2560
+POST_IMAGE_QUALITY = 85
+POST_IMAGE_WEBP_QUALITY = 80
+
+# Варианты миниатюр, которые используют шаблоны постов; создаются заранее.
+POST_THUMBNAIL_VARIANTS = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+# Потоков фонового создания миниатюр; 0 — создавать в самом запросе.
+THUMBNAIL_WORKERS = 2
+
+# 'local' — LocMemCache в каждом процессе, для разработки и тестов;
+# только с одним процессом: версии лент и подписки лежат в нём без срока,
+# и сброс в одном воркере не дошёл бы до остальных. 'shared' — общий для
+# всех воркеров кэш в файле SQLite с LRU процесса перед ним, по умолчанию
+# в профиле базы 'production'. Выбирается переменной окружения
+# YATUBE_CACHE.
+CACHE_PROFILE = os.environ.get(
+    'YATUBE_CACHE', 'shared' if DB_PROFILE == 'production' else 'local')
+
+if CACHE_PROFILE == 'shared':
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache_backends.TwoTierCache',
+            'LOCATION': 'shared',
+            'OPTIONS': {
+                'LOCAL_MAX_ENTRIES': 1000,
+                'LOCAL_TIMEOUT': 5,
+                # Версии лент, журнал поиска и счётчики читаются только
+                # из общего кэша, чтобы их изменения сразу видели все.
+                'LOCAL_BYPASS': (
+                    'feed-version:',
+                    'feed-modified:',
+                    'search-index:',
+                    'follow-graph:',
+                    'page-cache:',
+                ),
+            },
+        },
+        'shared': {
+            'BACKEND': 'core.cache_backends.SQLiteCache',
+            'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+            'OPTIONS': {'MAX_ENTRIES': 50_000},
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache_backends.LocMemCache',
+        }
     }
-}
 
 STATIC_URL = '/static/'
 
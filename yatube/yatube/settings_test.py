@@ -0,0 +1,8 @@
+"""Настройки для тестов: всё, как в ``settings``, но без фоновых потоков.
+
+Тестовая база SQLite живёт в памяти, и запись из другого потока в ней
+не ждёт блокировку, а сразу падает.
+"""
+from .settings import *  # noqa: F401,F403
+
+THUMBNAIL_WORKERS = 0